@@ -4,106 +4,297 @@
 Compute position at epoch(s).
 """
 
+import math
 import numpy as np
 
+__all__ = ["compPos", "compPosAtEpoch", "getBrkParams"]
+
 ########################################################################
 """
 Define constants
 """
  
 KAPPA = np.e - 1
+TWO_PI = 2*math.pi
+
+# max number of (break, epoch) elements compPos works on at a time
+_BLOCK_SIZE = 2**18
+
+# above this many breaks compPosAtEpoch sums the breaks with numpy
+# (when given brkParams) instead of a python loop
+_MAX_SCALAR_BRKS = 16
 
 ########################################################################
-def compPos(time, mdlFile, brkFile):
+def compPos(time, mdlFile, brkFile, brkParams=None):
 
     """
     Compute position for time range of interest using parameters 
     provided in mdlFile and brkFile
 
     Inputs:
+        time - epoch(s) in decimal years, array-like of shape (T,) or a
+               scalar (which is handed to compPosAtEpoch)
+        brkParams - optional result of getBrkParams(brkFile, mdlFile.re).
+               When compPos is called repeatedly with the same brkFile
+               (fitting, Monte Carlo, plotting at several resolutions)
+               pass it in to skip regathering the break parameters.
 
+    Returns:
+        (3,T) array of positions, one row per component, so it can be
+        unpacked as x1,x2,x3 = compPos(...). For a scalar time, 
+        [x1,x2,x3] as floats.
     """
+
+    time = np.asarray(time, dtype=float)
+    if time.ndim == 0:
+        return compPosAtEpoch(time, mdlFile, brkFile, brkParams)
     
     # shift time so that model reference year is zero epoch
     time = time - mdlFile.re
     
-    # Get non-break related parameters
-    dc = mdlFile.dc
-    vel = mdlFile.ve
-    sa = mdlFile.sa
-    ca = mdlFile.ca
-    ss = mdlFile.ss
-    cs = mdlFile.cs
-    o2 = mdlFile.o2
-    o3 = mdlFile.o3
-    o4 = mdlFile.o4
-
-    # compute position time series without break contributions
-    x1 = (dc[0] + time*vel[0] + sa[0]*np.sin(2*np.pi*time) 
-       + ca[0]*np.cos(2*np.pi*time) + ss[0]*np.sin(4*np.pi*time) 
-       + cs[0]*np.cos(4*np.pi*time) + o2[0]*time**2
-       + o3[0]*time**3 + o4[0]*time**4)
-    
-    x2 = (dc[1] + time*vel[1] + sa[1]*np.sin(2*np.pi*time) 
-       + ca[1]*np.cos(2*np.pi*time) + ss[1]*np.sin(4*np.pi*time) 
-       + cs[1]*np.cos(4*np.pi*time) + o2[1]*time**2
-       + o3[1]*time**3 + o4[1]*time**4)
-    
-    x3 = (dc[2] + time*vel[2] + sa[2]*np.sin(2*np.pi*time) 
-       + ca[2]*np.cos(2*np.pi*time) + ss[2]*np.sin(4*np.pi*time) 
-       + cs[2]*np.cos(4*np.pi*time) + o2[2]*time**2
-       + o3[2]*time**3 + o4[2]*time**4)
+    # Get non-break related parameters as (3,1) columns so that one 
+    # expression broadcasts against time to give all three components
+    coef = np.stack([mdlFile.dc, mdlFile.ve, mdlFile.sa, mdlFile.ca, 
+                     mdlFile.ss, mdlFile.cs, mdlFile.o2, mdlFile.o3, 
+                     mdlFile.o4])[:, :, None]
+    dc, vel, sa, ca, ss, cs, o2, o3, o4 = coef
+
+    # higher order terms in Horner form, 
+    # o2*t**2 + o3*t**3 + o4*t**4 = ((o4*t + o3)*t + o2)*t*t
+    poly = o4*time
+    poly += o3
+    poly *= time
+    poly += o2
+    poly *= time
+    poly *= time
+
+    # annual terms, with the semi-annual ones from the double angle 
+    # identities instead of two more trig evaluations
+    w1 = TWO_PI*time
+    s1 = np.sin(w1)
+    c1 = np.cos(w1)
+    s2 = 2*s1*c1
+    c2 = (c1 - s1)*(c1 + s1)
+
+    # compute position time series without break contributions, 
+    # accumulating in place into the (3,T) polynomial buffer
+    x = poly
+    x += dc
+    x += vel*time
+    x += sa*s1
+    x += ca*c1
+    x += ss*s2
+    x += cs*c2
 
     # add in contribution from break terms
+    if brkParams is None:
+        brkParams = getBrkParams(brkFile, mdlFile.re)
+    (brkTimes, offset, dV, expTau, expMag, logTau, logMag, 
+     invExpTau, invLogTau) = brkParams
+    K = brkTimes.size
+
+    # magnitudes as (3,.) matrices so break contributions sum over 
+    # breaks (and exp terms) as matrix products
+    offsetT = offset.T
+    dVT = dV.T
+    # (negated, as the exp terms below are kept as expm1(-dt/tau))
+    expMagT = -expMag.reshape(3*K, 3).T
+    logMagT = logMag.T
+
+    # time constants shaped to broadcast against (K,n) and (K,3,n), as
+    # reciprocals so the element-wise work is multiplies, not divides
+    negInvExpTau = -invExpTau[:,:,None]
+    invLogTau = invLogTau[:,None]
+    logCut = KAPPA*logTau[:,None]
+
+    # all breaks are handled at once on (K,n) arrays; time is split in 
+    # blocks so these stay a manageable size for long series
+    blk = max(1, _BLOCK_SIZE//max(1, 3*K))
+    for i0 in range(0, time.size, blk):
+        sl = slice(i0, i0+blk)
+
+        # time since each break, zero before the break so that none 
+        # of the terms below contribute there
+        dt = time[sl] - brkTimes[:,None]
+        timeBool = dt > 0
+        np.maximum(dt, 0., out=dt)
+
+        # (K,3,n) exp terms, (K,n) log term
+        # (expm1/log1p stay accurate for dt much smaller than tau)
+        e = np.multiply(dt[:,None,:], negInvExpTau)
+        np.expm1(e, out=e)
+
+        # the log term is only applied up to dt/tau = kappa, where it 
+        # reaches log(1 + kappa) = 1 and stays there
+        lg = np.log1p(dt*invLogTau)
+        np.copyto(lg, 1., where=dt > logCut)
+
+        # sum the (3,n) contributions into one buffer, in place
+        acc = offsetT @ timeBool.astype(float)
+        acc += dVT @ dt
+        acc += expMagT @ e.reshape(3*K, dt.shape[1])
+        acc += logMagT @ lg
+        x[:,sl] += acc
+
+    return x
+
+########################################################################
+def compPosAtEpoch(decYear, mdlFile, brkFile, brkParams=None):
+
+    """
+    Compute position at a single epoch decYear (decimal year) using 
+    parameters provided in mdlFile and brkFile. Same model as compPos,
+    but evaluated with scalar math functions, which avoids the per-call
+    overhead of numpy when only one epoch is needed.
+
+    brkParams (from getBrkParams) is optional; with many breaks it lets
+    the break terms be summed in one vectorized pass.
+
+    Returns [x1,x2,x3] as floats. If decYear is an array of epochs, 
+    all of them are evaluated at once by compPos and a (3,T) array is
+    returned (brkParams is passed on to compPos).
+    """
+
+    if np.ndim(decYear) > 0:
+        return compPos(decYear, mdlFile, brkFile, brkParams)
+
+    # shift time so that model reference year is zero epoch
+    refYear = float(mdlFile.re)
+    t = float(decYear) - refYear
+
+    w1 = TWO_PI*t
+    s1 = math.sin(w1)
+    c1 = math.cos(w1)
+    s2 = 2*s1*c1
+    c2 = (c1 - s1)*(c1 + s1)
+
+    # read model parameters into local float lists once
+    dc = mdlFile.dc.tolist()
+    vel = mdlFile.ve.tolist()
+    sa = mdlFile.sa.tolist()
+    ca = mdlFile.ca.tolist()
+    ss = mdlFile.ss.tolist()
+    cs = mdlFile.cs.tolist()
+    o2 = mdlFile.o2.tolist()
+    o3 = mdlFile.o3.tolist()
+    o4 = mdlFile.o4.tolist()
+
+    x = [dc[i] + vel[i]*t + sa[i]*s1 + ca[i]*c1 + ss[i]*s2 + cs[i]*c2
+         + ((o4[i]*t + o3[i])*t + o2[i])*t*t for i in range(3)]
+
+    # with many breaks and the packed params at hand, one numpy pass 
+    # over all breaks beats looping over them in python
+    if brkParams is not None and brkParams[0].size > _MAX_SCALAR_BRKS:
+        brk = _brkTermsAtEpoch(t, brkParams)
+        return [x[0] + brk[0], x[1] + brk[1], x[2] + brk[2]]
+
+    # add in contribution from breaks before the epoch
     for brk in brkFile.breaks:
 
-        # shift time of break to be w.r.t. reference epoch
-        brkTime = brk.decYear - mdlFile.re
-
-        # create boolean array for time greater than time of break
-        timeBool = time > brkTime
-
-        # get break params
-        offset = brk.offset # [offset_x1, offset_x2, offset_x3]
-        dV = brk.deltaV # [dV_x1, dV_x2, dV_x3]
-        exp1 = brk.exp1 # [tau1,exp1MagX1,exp1MagX2,exp1MagX3]
-        exp2 = brk.exp2 # [tau2,exp2MagX1,exp2MagX2,exp2MagX3]
-        exp3 = brk.exp3 # [tau3,exp3MagX1,exp3MagX2,exp3MagX3]
-        log = brk.log   # [tau4,logMagX1,logMagX2,logMagX3]
-        
-        # create boolean arrays needed to only apply log term for 
-        # dt/tau = kappa
-        logBool1 = time <= KAPPA*log[0]+brkTime
-        logBool2 = time > KAPPA*log[0]+brkTime
-
-        x1 = x1 + timeBool*(
-                      offset[0] + dV[0]*(time-brkTime)
-                    + exp1[1]*(1-np.exp(-(time-brkTime)/exp1[0]))
-                    + exp2[1]*(1-np.exp(-(time-brkTime)/exp2[0]))
-                    + exp3[1]*(1-np.exp(-(time-brkTime)/exp3[0]))
-                    + log[1]*logBool1
-                            *(np.log(1+np.abs(time-brkTime)/log[0]))
-                    + log[1]*logBool2
-                           )
-        
-        x2 = x2 + timeBool*(
-                      offset[1] + dV[1]*(time-brkTime) 
-                    + exp1[2]*(1-np.exp(-(time-brkTime)/exp1[0]))
-                    + exp2[2]*(1-np.exp(-(time-brkTime)/exp2[0]))
-                    + exp3[2]*(1-np.exp(-(time-brkTime)/exp3[0]))
-                    + log[2]*logBool1
-                            *(np.log(1+np.abs(time-brkTime)/log[0]))
-                    + log[2]*logBool2
-                           )
-        
-        x3 = x3 + timeBool*(
-                      offset[2] + dV[2]*(time-brkTime) 
-                    + exp1[3]*(1-np.exp(-(time-brkTime)/exp1[0]))
-                    + exp2[3]*(1-np.exp(-(time-brkTime)/exp2[0]))
-                    + exp3[3]*(1-np.exp(-(time-brkTime)/exp3[0]))
-                    + log[3]*logBool1
-                            *(np.log(1+np.abs(time-brkTime)/log[0]))
-                    + log[3]*logBool2
-                           )
-
-    return [x1,x2,x3]
+        dt = t - (brk.decYear - refYear)
+        if dt <= 0:
+            continue
+
+        offset = brk.offset.tolist()
+        dV = brk.deltaV.tolist()
+        exp1 = brk.exp1.tolist()
+        exp2 = brk.exp2.tolist()
+        exp3 = brk.exp3.tolist()
+        log = brk.log.tolist()
+
+        e1 = -math.expm1(-dt/exp1[0])
+        e2 = -math.expm1(-dt/exp2[0])
+        e3 = -math.expm1(-dt/exp3[0])
+        if dt <= KAPPA*log[0]:
+            lg = math.log1p(dt/log[0])
+        else:
+            lg = 1.
+
+        for i in range(3):
+            x[i] += (offset[i] + dV[i]*dt + exp1[i+1]*e1 + exp2[i+1]*e2 
+                     + exp3[i+1]*e3 + log[i+1]*lg)
+
+    return x
+
+def _brkTermsAtEpoch(t, brkParams):
+
+    """
+    Sum of the break contributions at a single epoch t (relative to the
+    reference year) over all breaks at once, brkParams as returned by
+    getBrkParams. Returns a (3,) array.
+    """
+
+    (brkTimes, offset, dV, expTau, expMag, logTau, logMag, 
+     invExpTau, invLogTau) = brkParams
+
+    # only breaks before the epoch contribute; breaks are sorted by 
+    # epoch, so those are the first k rows
+    k = np.searchsorted(brkTimes, t, side='left')
+    dt = t - brkTimes[:k]
+
+    e = -np.expm1(-dt[:,None]*invExpTau[:k])        # (k,3)
+    lg = np.log1p(dt*invLogTau[:k])                 # (k,)
+    lg[dt > KAPPA*logTau[:k]] = 1.
+
+    return (offset[:k].sum(axis=0) + dt @ dV[:k] 
+            + np.einsum('kj,kjc->c', e, expMag[:k]) 
+            + lg @ logMag[:k])
+
+########################################################################
+def getBrkParams(brkFile, refYear):
+
+    """
+    Gather the parameters of all breaks in brkFile into arrays with one
+    row per break, so they are read off the Tsbrk objects once. Rows 
+    are sorted by break epoch, so the breaks before an epoch are a 
+    leading slice (np.searchsorted(brkTimes, t)).
+
+    Inputs:
+        brkFile - BrkFile object
+        refYear - reference epoch (decimal year) break times are 
+                  given relative to
+
+    Returns:
+        brkTimes - (K,) break epochs relative to refYear
+        offset   - (K,3) offsets
+        dV       - (K,3) velocity changes
+        expTau   - (K,3) time constants of the three exp terms
+        expMag   - (K,3,3) exp magnitudes, [break, exp term, component]
+        logTau   - (K,) time constant of the log term
+        logMag   - (K,3) log magnitudes
+        invExpTau - (K,3) 1/expTau
+        invLogTau - (K,) 1/logTau
+    """
+
+    breaks = sorted(brkFile.breaks, key=lambda brk: brk.decYear)
+
+    # one row per break: decYear, offset, deltaV, exp taus, 
+    # exp magnitudes (3x3, row per exp term), log tau, log magnitudes
+    params = np.empty((len(breaks), 23))
+    for i, brk in enumerate(breaks):
+        params[i,0] = brk.decYear
+        params[i,1:4] = brk.offset
+        params[i,4:7] = brk.deltaV
+        params[i,7:10] = brk.exp1[0], brk.exp2[0], brk.exp3[0]
+        params[i,10:13] = brk.exp1[1:]
+        params[i,13:16] = brk.exp2[1:]
+        params[i,16:19] = brk.exp3[1:]
+        params[i,19:23] = brk.log
+
+    # split the rows into separate C-contiguous arrays, so each 
+    # parameter is one dense block rather than a strided view of params
+    brkTimes = params[:,0] - refYear
+    offset = np.ascontiguousarray(params[:,1:4])
+    dV = np.ascontiguousarray(params[:,4:7])
+    expTau = np.ascontiguousarray(params[:,7:10])
+    expMag = np.ascontiguousarray(params[:,10:19]).reshape(-1, 3, 3)
+    logTau = np.ascontiguousarray(params[:,19])
+    logMag = np.ascontiguousarray(params[:,20:23])
+
+    # reciprocal time constants, computed once here so evaluating the
+    # break terms multiplies instead of divides
+    invExpTau = 1.0/expTau
+    invLogTau = 1.0/logTau
+
+    return (brkTimes, offset, dV, expTau, expMag, logTau, logMag, 
+            invExpTau, invLogTau)
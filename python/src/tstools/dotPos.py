@@ -2,7 +2,11 @@
 # coding: utf-8
 
 import numpy as np
-import pandas as pd
+
+# .pos columns that are not floats, the rest of the columns are read as 
+# float64
+_INT_COLS = ('YYYYMMDD', 'HHMMSS')
+_STR_COLS = {'Soln': 'U16'}
 
 class DotPosFile:
     '''
@@ -13,25 +17,43 @@ class DotPosFile:
     def __init__(self, filename):
         '''
         Initializes a DotPosFile object given and input file name.
+        Only the header is read here, the time series data is read on 
+        first access of self.data.
         '''
         
         self.fileName = filename
-        self.data   = pd.DataFrame()
         self.header = {} 
         self.readDotPos(self.fileName)
         
     def readDotPos(self, filename):
         """
-        Read .pos file format.
+        Read .pos file format. Stores the header, the column labels and 
+        where the data starts in the file; the data itself is parsed 
+        lazily by the data property.
         """
 
         # open file
         with open(filename) as f:
             # store metadata
-            labels = self.__parseHdr__(f)
-            # return dataframe of all time series data
-            data = self.__parseData__(f, labels)
+            self._labels = self.__parseHdr__(f)
+            # remember where the data starts, to seek there later
+            self._dataOffset = f.tell()
+        self.fileName = filename
+        self._data = None
         return self
+
+    @property
+    def data(self):
+        '''
+        Structured array of all time series data, read from the file on 
+        first access.
+        '''
+
+        if self._data is None:
+            with open(self.fileName) as f:
+                f.seek(self._dataOffset)
+                self.__parseData__(f, self._labels)
+        return self._data
     
     def getStationId(self):
         '''
@@ -116,7 +138,9 @@ class DotPosFile:
         """
         
         self.header = {}
-        for line in f:
+        # readline rather than iterating over f, so f.tell() stays 
+        # usable once the header has been read
+        for line in iter(f.readline, ''):
             # remove EOL characters
             line = line.strip()
 
@@ -135,12 +159,19 @@ class DotPosFile:
 
     def __parseData__(self, f, labels):
         '''
-        Loads the time series data from a .pos file into a pandas dataframe.
+        Loads the time series data from a .pos file into a numpy structured 
+        array, one field per column (self.data['X'], self.data['dN'], ...).
         This method requires a file handle and a list of labels for each column
         in the file.
         '''
 
-        self.data = pd.read_csv(f, names=labels, delimiter="\s+")
+        # typed record layout so np.loadtxt's C parser reads the rows in 
+        # a single pass, without going through pandas
+        dtype = np.dtype([(label, np.int64 if label in _INT_COLS 
+                           else _STR_COLS.get(label, np.float64)) 
+                          for label in labels])
+
+        self._data = np.loadtxt(f, dtype=dtype, ndmin=1)
         return
 
 if __name__ == '__main__':
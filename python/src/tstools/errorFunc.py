@@ -4,6 +4,8 @@
 Evaluate error functions and their gradients.
 """
 
+from collections import namedtuple
+
 import numpy as np         # then 3rd party libs
 
 from tstools.util.convtime import convtime
@@ -20,6 +22,75 @@ X1 = 1
 X2 = 2
 X3 = 3
 
+# basis function (key of the dict returned by genBasis) and component 
+# for each non-break parameter
+_NON_BRK_BASIS = {
+    params.DC_X1: ('dc', X1), params.DC_X2: ('dc', X2), 
+    params.DC_X3: ('dc', X3),
+    params.VE_X1: ('ve', X1), params.VE_X2: ('ve', X2), 
+    params.VE_X3: ('ve', X3),
+    params.SA_X1: ('sa', X1), params.SA_X2: ('sa', X2), 
+    params.SA_X3: ('sa', X3),
+    params.CA_X1: ('ca', X1), params.CA_X2: ('ca', X2), 
+    params.CA_X3: ('ca', X3),
+    params.SS_X1: ('ss', X1), params.SS_X2: ('ss', X2), 
+    params.SS_X3: ('ss', X3),
+    params.CS_X1: ('cs', X1), params.CS_X2: ('cs', X2), 
+    params.CS_X3: ('cs', X3),
+    params.O2_X1: ('o2', X1), params.O2_X2: ('o2', X2), 
+    params.O2_X3: ('o2', X3),
+    params.O3_X1: ('o3', X1), params.O3_X2: ('o3', X2), 
+    params.O3_X3: ('o3', X3),
+    params.O4_X1: ('o4', X1), params.O4_X2: ('o4', X2), 
+    params.O4_X3: ('o4', X3),
+    }
+
+# term (Tsbrk attribute) and component for each break parameter, 
+# component None for the time constants
+_BRK_PARAMS = {
+    params.OFF_X1: ('off', X1), params.OFF_X2: ('off', X2), 
+    params.OFF_X3: ('off', X3),
+    params.DV_X1: ('dv', X1), params.DV_X2: ('dv', X2), 
+    params.DV_X3: ('dv', X3),
+    params.EXP1_TAU: ('exp1', None), params.EXP1_X1: ('exp1', X1), 
+    params.EXP1_X2: ('exp1', X2), params.EXP1_X3: ('exp1', X3),
+    params.EXP2_TAU: ('exp2', None), params.EXP2_X1: ('exp2', X1), 
+    params.EXP2_X2: ('exp2', X2), params.EXP2_X3: ('exp2', X3),
+    params.EXP3_TAU: ('exp3', None), params.EXP3_X1: ('exp3', X1), 
+    params.EXP3_X2: ('exp3', X2), params.EXP3_X3: ('exp3', X3),
+    params.LOG_TAU: ('log', None), params.LOG_X1: ('log', X1), 
+    params.LOG_X2: ('log', X2), params.LOG_X3: ('log', X3),
+    }
+
+# partials of a break's parameters per unit magnitude, evaluated at all
+# epochs, see _breakBasis
+BreakBasis = namedtuple('BreakBasis', 
+                        ['off', 'dv', 'exp1', 'exp2', 'exp3', 'log', 
+                         'exp1Tau', 'exp2Tau', 'exp3Tau', 'logTau'])
+
+# break parameters whose partials do not depend on any estimate
+_STATIC_BRK_PARAMS = (params.OFF_X1, params.OFF_X2, params.OFF_X3,
+                      params.DV_X1, params.DV_X2, params.DV_X3)
+
+# number of components fit in each mode
+_MODE_DIMS = {ifio.ONE_DIM: 1, ifio.TWO_DIM: 2, ifio.THREE_DIM: 3}
+
+########################################################################
+def _zeros(n, _cache={}):
+
+    """
+    Return a read-only array of n zeros, shared between calls with the
+    same n, for the partials that are zero at every epoch.
+    """
+
+    zeros = _cache.get(n)
+    if zeros is None:
+        zeros = np.zeros(n)
+        zeros.flags.writeable = False
+        zeros = _cache.setdefault(n, zeros)
+
+    return zeros
+
 ########################################################################
 def errorFunc( paramVec, paramMap, tsObs, mdlFileIn, brkFileIn, mode):
 
@@ -52,43 +123,29 @@ def chiSquare( tsObs, tsHat, mode):
     Compute chi squared for the current model predicted time series.
     
     Input(s):
-    tsObs       - 
-    """
-
-    if mode == ifio.ONE_DIM:
-
-        obs_pos = tsObs.pos[0]
-        obs_sig = tsObs.sig[0]
-        mdl_pos = tsHat.pos[0]
-        
-    elif mode == ifio.TWO_DIM:
-
-        obs_pos = np.concatenate([tsObs.pos[0],
-                                 tsObs.pos[1]])
-        obs_sig = np.concatenate([tsObs.sig[0],
-                                 tsObs.sig[1]])
-        mdl_pos = np.concatenate([tsHat.pos[0],
-                                 tsHat.pos[1]])
+    tsObs       - TimeSeries object of obervations
+    tsHat       - TimeSeries object computed from the current model
+    mode        - ifio.ONE_DIM, ifio.TWO_DIM or ifio.THREE_DIM, number
+                  of components fit
 
-    elif mode == ifio.THREE_DIM:
+    Output(s):
+    chi2        - chi squared summed over the components fit
+    """
 
-        obs_pos = np.concatenate([tsObs.pos[0],
-                                 tsObs.pos[1],
-                                 tsObs.pos[2]])
-        obs_sig = np.concatenate([tsObs.sig[0],
-                                 tsObs.sig[1],
-                                 tsObs.sig[2]])
-        mdl_pos = np.concatenate([tsHat.pos[0],
-                                 tsHat.pos[1],
-                                 tsHat.pos[2]])
+    # sum of squared normalized residuals, one component at a time; 
+    # the dot product squares and sums in one pass, without the 
+    # concatenated copies of all components
+    chi2 = 0.
+    for d in range(_MODE_DIMS[mode]):
 
-    chi2 = np.sum(((obs_pos - mdl_pos)/obs_sig)**2)
+        r = (tsObs.pos[d] - tsHat.pos[d])/tsObs.sig[d]
+        chi2 += r @ r
 
     return chi2
 
 ########################################################################
 def gradChiSquare( tsObs, tsHat, mdlFileHat, brkFileHat, 
-                   paramMap, mode):
+                   paramMap, mode, jac=None):
 
     """
     Compute the gradient of the chi-squared function w.r.t. the model
@@ -104,6 +161,12 @@ def gradChiSquare( tsObs, tsHat, mdlFileHat, brkFileHat,
                   break-related parameters being estimated.
     paramMap    - parameter map created from MdlFile and BrkFile 
                   objects with parameters.genParamVecAndMap()
+    jac         - optional Jacobian from buildJacobian (or a previous 
+                  call) for the same tsObs, paramMap and mode. Its static
+                  columns (see staticParams) are reused as they are, the
+                  others are recomputed in place for the current 
+                  estimates. Build it once per fit and pass it to every
+                  call.
     
     Output(s):
     gradVec     - 1D numpy array the same length as paramMap[0] with 
@@ -114,838 +177,323 @@ def gradChiSquare( tsObs, tsHat, mdlFileHat, brkFileHat,
                   [paramMap[0][i],paramMap[1][i]]
     """
 
-    gradVec = np.zeros([len(paramMap[0]),])
-
-    if mode == ifio.ONE_DIM:
-
-        for i, param in enumerate(paramMap[0]):
+    # number of components fit
+    D = _MODE_DIMS[mode]
 
-            paramMap_i = [paramMap[0][i],paramMap[1][i]]
-
-            x1_partial = xHatPartial( paramMap_i, tsObs, X1, 
-                                      mdlFileHat, brkFileHat)
-
-            deltaX1 = tsObs.pos[0] - tsHat.pos[0]
-
-            gradVec[i] = 2*np.sum((deltaX1*x1_partial)/(tsObs.sig[0]**2))
-
-    elif mode == ifio.TWO_DIM:
-        
-        for i, param in enumerate(paramMap[0]):
-            
-            paramMap_i = [paramMap[0][i],paramMap[1][i]]
-
-            x1_partial = xHatPartial( paramMap_i, tsObs, X1, 
-                                      mdlFileHat, brkFileHat)
-            
-            x2_partial = xHatPartial( paramMap_i, tsObs, X2, 
-                                      mdlFileHat, brkFileHat)
-
-            deltaX1 = tsObs.pos[0] - tsHat.pos[0]
-            
-            deltaX2 = tsObs.pos[1] - tsHat.pos[1]
-
-            gradVec[i] = 2*np.sum(
-                           (deltaX1*x1_partial)/(tsObs.sig[0]**2)
-                          +(deltaX2*x2_partial)/(tsObs.sig[1]**2))
-
-    elif mode == ifio.THREE_DIM:
-
-        for i, param in enumerate(paramMap[0]):
-            
-            paramMap_i = [paramMap[0][i],paramMap[1][i]]
-
-            x1_partial = xHatPartial( paramMap_i, tsObs, X1, 
-                                      mdlFileHat, brkFileHat)
-            
-            x2_partial = xHatPartial( paramMap_i, tsObs, X2, 
-                                      mdlFileHat, brkFileHat)
-            
-            x3_partial = xHatPartial( paramMap_i, tsObs, X3, 
-                                      mdlFileHat, brkFileHat)
+    # (D*N,P) matrix of all partials, components stacked along rows
+    if jac is None:
+        jac = buildJacobian(tsObs, mdlFileHat, brkFileHat, paramMap, mode)
+    else:
+        # only the partials that change with the current estimates
+        static = staticParams(paramMap)
+        cols = [i for i in range(len(static)) if not static[i]]
+        buildJacobian(tsObs, mdlFileHat, brkFileHat, paramMap, mode, 
+                      jac=jac, cols=cols)
 
-            deltaX1 = tsObs.pos[0] - tsHat.pos[0]
-            
-            deltaX2 = tsObs.pos[1] - tsHat.pos[1]
-            
-            deltaX3 = tsObs.pos[2] - tsHat.pos[2]
+    # residuals weighted by the inverse variances, stacked the same way
+    wRes = np.concatenate([(tsObs.pos[d] - tsHat.pos[d])/(tsObs.sig[d]**2)
+                           for d in range(D)])
 
-            gradVec[i] = 2*np.sum(
-                           (deltaX1*x1_partial)/(tsObs.sig[0]**2)
-                          +(deltaX2*x2_partial)/(tsObs.sig[1]**2)
-                          +(deltaX3*x3_partial)/(tsObs.sig[2]**2))
+    # one matrix-vector product for all parameters
+    gradVec = 2*(wRes @ jac)
 
     return gradVec
 
 ########################################################################
-def xHatPartial( param, tsObs, component, mdlFile, brkFile):
+def buildJacobian( tsObs, mdlFile, brkFile, paramMap, mode, basis=None,
+                   jac=None, cols=None):
 
     """
-    Compute the partial derivative of x-hat w.r.t. the given parameter 
-    (param) at the epoch of interest (time) for the component (x1,x2,x3)
-    of interest.
+    Compute the partial derivatives of x-hat w.r.t. all parameters in 
+    paramMap as the columns of one matrix.
 
     Input(s):
-    param       - list with 2 integers constructed from the paramMap.
-                  first item in list is the value from the 1st column of 
-                  paramMap for the parameter of interest, the 2nd item is 
-                  the value from the 2nd column of paramMap.
-    tsObs       - TimeSeries object with observation data    
-    component   - use constants X1, X2, or X3 to pass function which 
-                  component the parital is being computed for
+    tsObs       - TimeSeries object with observation data
     mdlFile     - MdlFile object containing the current value of the 
                   non-break parameters being estimated.
     brkFile     - BrkFile object containing the current values of the
                   Tsbreak model parameters being estimated.
+    paramMap    - parameter map created from MdlFile and BrkFile 
+                  objects with parameters.genParamVecAndMap()
+    mode        - ifio.ONE_DIM, ifio.TWO_DIM or ifio.THREE_DIM, number
+                  of components fit
+    basis       - optional dict from genBasis(tsObs.time - mdlFile.re)
+    jac         - optional (D*N,P) array to fill in place, columns not
+                  in cols are left as they are
+    cols        - optional list of the column (paramMap) indices to 
+                  compute, default all
 
     Output(s):
-    partial     - the partial derivative of x-hat w.r.t. the parameter of
-                  interest evaluated at the time of interest and with 
-                  the current model parameters for the component of 
-                  interest.
+    jac         - (D*N,P) numpy array, D the number of components, N 
+                  the number of epochs and P the number of parameters.
+                  jac[d*N:(d+1)*N,i] is the partial derivative of 
+                  component d+1 of x-hat w.r.t. the parameter described 
+                  by [paramMap[0][i],paramMap[1][i]]
     """
-    
-    # get 1D numpy time array from tsObs and reference to the 
-    # reference epoch in mdlFile object
-    time = tsObs.time - mdlFile.re    
-
-    # parameters from the mdlFile will have a zero-th index of 0
-    if param[0] == params.NON_BRK:
-
-        if param[1] == params.DC_X1:
-
-            if component == X1:
-            
-                partial = np.array([1.]*time.shape[0])
-
-            elif component == X2:
-
-                partial = np.array([0.]*time.shape[0])
-
-            elif component == X3:
-
-                partial = np.array([0.]*time.shape[0])
-
-        elif param[1] == params.DC_X2:
-
-            if component == X1:
-            
-                partial = np.array([0.]*time.shape[0])
-
-            elif component == X2:
-
-                partial = np.array([1.]*time.shape[0])
-
-            elif component == X3:
-
-                partial = np.array([0.]*time.shape[0])
-        
-        elif param[1] == params.DC_X3:
-
-            if component == X1:
-            
-                partial = np.array([0.]*time.shape[0])
-
-            elif component == X2:
-
-                partial = np.array([0.]*time.shape[0])
-
-            elif component == X3:
-
-                partial = np.array([1.]*time.shape[0])
-
-        if param[1] == params.VE_X1:
-
-            if component == X1:
-            
-                partial = time
-
-            elif component == X2:
-
-                partial = np.array([0.]*time.shape[0])
-
-            elif component == X3:
 
-                partial = np.array([0.]*time.shape[0])
+    D = _MODE_DIMS[mode]
+    N = tsObs.time.shape[0]
 
-        elif param[1] == params.VE_X2:
+    if cols is None:
+        cols = range(len(paramMap[0]))
 
-            if component == X1:
-            
-                partial = np.array([0.]*time.shape[0])
+    # the basis is only needed for non-break parameters
+    if basis is None and any(paramMap[0][i] == params.NON_BRK 
+                             for i in cols):
+        basis = genBasis(tsObs.time - mdlFile.re)
 
-            elif component == X2:
+    # column-major, so each column is filled with contiguous writes
+    if jac is None:
+        jac = np.empty((D*N, len(paramMap[0])), order='F')
 
-                partial = time
+    # exp/log terms of each break, evaluated once for all of its 
+    # parameters and components
+    brkBases = {}
 
-            elif component == X3:
+    for i in cols:
 
-                partial = np.array([0.]*time.shape[0])
-        
-        elif param[1] == params.VE_X3:
+        paramMap_i = [paramMap[0][i],paramMap[1][i]]
 
-            if component == X1:
-            
-                partial = np.array([0.]*time.shape[0])
+        brkBasis = None
+        if paramMap_i[0] != params.NON_BRK:
+            brkBasis = brkBases.get(paramMap_i[0])
+            if brkBasis is None:
+                brkBasis = _breakBasis(tsObs.time - mdlFile.re,
+                                       brkFile.breaks[paramMap_i[0]-1],
+                                       mdlFile)
+                brkBases[paramMap_i[0]] = brkBasis
 
-            elif component == X2:
+        for d in range(D):
 
-                partial = np.array([0.]*time.shape[0])
+            jac[d*N:(d+1)*N, i] = xHatPartial( paramMap_i, tsObs, d+1, 
+                                               mdlFile, brkFile, basis,
+                                               brkBasis)
 
-            elif component == X3:
+    return jac
 
-                partial = time
-        
-        elif param[1] == params.SA_X1:
-            
-            if component == X1:
-            
-                partial = np.sin(2*np.pi*time)
-
-            elif component == X2:
-
-                partial = np.array([0.]*time.shape[0])
-
-            elif component == X3:
-
-                partial = np.array([0.]*time.shape[0])
-
-        elif param[1] == params.SA_X2:
-
-            if component == X1:
-            
-                partial = np.array([0.]*time.shape[0])
-            
-            elif component == X2:
-
-                partial = np.sin(2*np.pi*time)
-
-            elif component == X3:
-
-                partial = np.array([0.]*time.shape[0])
-
-        elif param[1] == params.SA_X3:
-
-            if component == X1:
-            
-                partial = np.array([0.]*time.shape[0])
-            
-            elif component == X2:
-
-                partial = np.array([0.]*time.shape[0])
-
-            elif component == X3:
-
-                partial = np.sin(2*np.pi*time)
-        
-        elif param[1] == params.CA_X1:
-            
-            if component == X1:
-            
-                partial = np.cos(2*np.pi*time)
-            
-            elif component == X2:
-
-                partial = np.array([0.]*time.shape[0])
-
-            elif component == X3:
-
-                partial = np.array([0.]*time.shape[0]) 
-
-        elif param[1] == params.CA_X2:
-
-            if component == X1:
-            
-                partial = np.array([0.]*time.shape[0])
-           
-            elif component == X2:
-
-                partial = np.cos(2*np.pi*time)
-
-            elif component == X3:
-
-                partial = np.array([0.]*time.shape[0]) 
-
-        elif param[1] == params.CA_X3:
-
-            if component == X1:
-            
-                partial = np.array([0.]*time.shape[0])
-           
-            elif component == X2:
-
-                partial = np.array([0.]*time.shape[0]) 
-
-            elif component == X3:
-
-                partial = np.cos(2*np.pi*time)
-        
-        elif param[1] == params.SS_X1:
-
-            if component == X1:
-            
-                partial = np.sin(4*np.pi*time)
-           
-            elif component == X2:
-
-                partial = np.array([0.]*time.shape[0]) 
-
-            elif component == X3:
-
-                partial = np.array([0.]*time.shape[0])
-
-        elif param[1] == params.SS_X2:
-
-            if component == X1:
-            
-                partial = np.array([0.]*time.shape[0]) 
-          
-            elif component == X2:
-
-                partial = np.sin(4*np.pi*time)
-
-            elif component == X3:
-
-                partial = np.array([0.]*time.shape[0])
-
-        elif param[1] == params.SS_X3:
-
-            if component == X1:
-            
-                partial = np.array([0.]*time.shape[0]) 
-          
-            elif component == X2:
-
-                partial = np.array([0.]*time.shape[0])
-
-            elif component == X3:
-
-                partial = np.sin(4*np.pi*time)
-        
-        elif param[1] == params.CS_X1:
-
-            if component == X1:
-            
-                partial = np.cos(4*np.pi*time)
-          
-            elif component == X2:
-
-                partial = np.array([0.]*time.shape[0])
-
-            elif component == X3:
-
-                partial =  0. 
-
-        elif param[1] == params.CS_X2:
-
-            if component == X1:
-            
-                partial = np.array([0.]*time.shape[0])
-         
-            elif component == X2:
-
-                partial = np.cos(4*np.pi*time)
-
-            elif component == X3:
-
-                partial = np.array([0.]*time.shape[0]) 
-
-        elif param[1] == params.CS_X3:
-
-            if component == X1:
-            
-                partial = np.array([0.]*time.shape[0])
-         
-            elif component == X2:
-
-                partial = np.array([0.]*time.shape[0]) 
-
-            elif component == X3:
-
-                partial = np.cos(4*np.pi*time)
-        
-        elif param[1] == params.O2_X1:
-
-            if component == X1:
-            
-                partial = time**2
-         
-            elif component == X2:
-
-                partial = np.array([0.]*time.shape[0]) 
+########################################################################
+def staticParams( paramMap):
 
-            elif component == X3:
+    """
+    Flag the parameters whose partials do not depend on the current 
+    parameter estimates, only on the epochs and break times: all 
+    non-break parameters and the break offsets and velocity changes.
+    Their columns of the Jacobian stay the same for a whole fit.
 
-                partial = np.array([0.]*time.shape[0])
+    Input(s):
+    paramMap    - parameter map created from MdlFile and BrkFile 
+                  objects with parameters.genParamVecAndMap()
 
-        elif param[1] == params.O2_X2:
+    Output(s):
+    static      - list of bools the same length as paramMap[0]
+    """
 
-            if component == X1:
-            
-                partial = np.array([0.]*time.shape[0]) 
-        
-            elif component == X2:
+    static = [paramMap[0][i] == params.NON_BRK 
+              or paramMap[1][i] in _STATIC_BRK_PARAMS
+              for i in range(len(paramMap[0]))]
 
-                partial = time**2
+    return static
 
-            elif component == X3:
+########################################################################
+def genBasis( time):
 
-                partial = np.array([0.]*time.shape[0])
+    """
+    Evaluate the basis functions of time that the partials of the 
+    non-break parameters are made of.
 
-        elif param[1] == params.O2_X3:
+    Input(s):
+    time        - 1D numpy array of epochs relative to the model 
+                  reference year (tsObs.time - mdlFile.re)
 
-            if component == X1:
-            
-                partial = np.array([0.]*time.shape[0]) 
-        
-            elif component == X2:
+    Output(s):
+    basis       - dict of 1D numpy arrays the same length as time, with
+                  keys 'dc', 've', 'sa', 'ca', 'ss', 'cs', 'o2', 'o3', 
+                  'o4' (the partial w.r.t. the parameter of the same 
+                  name) and 'zeros'
+    """
 
-                partial = np.array([0.]*time.shape[0])
+    n = time.shape[0]
 
-            elif component == X3:
+    basis = {'zeros': _zeros(n),
+             'dc': np.ones(n),
+             've': time,
+             'sa': np.sin(2*np.pi*time),
+             'ca': np.cos(2*np.pi*time),
+             'ss': np.sin(4*np.pi*time),
+             'cs': np.cos(4*np.pi*time),
+             'o2': time**2,
+             'o3': time**3,
+             'o4': time**4}
 
-                partial = time**2
-        
-        elif param[1] == params.O3_X1:
+    return basis
 
-            if component == X1:
-            
-                partial = time**3
-        
-            elif component == X2:
+########################################################################
+def _breakBasis( time, brk, mdlFile):
 
-                partial = np.array([0.]*time.shape[0])
+    """
+    Evaluate the partials of x-hat w.r.t. the parameters of one break, 
+    per unit magnitude, so each is computed once per break rather than 
+    once per parameter and component. A partial w.r.t. a magnitude is 
+    the array itself, one w.r.t. a time constant is the array times 
+    that component's magnitude.
 
-            elif component == X3:
+    Each partial is built with in place operations on one buffer, 
+    including the mask that zeroes it before the break, so only a 
+    couple of temporaries are allocated per term.
 
-                partial = np.array([0.]*time.shape[0]) 
+    Input(s):
+    time        - 1D numpy array of epochs relative to the model 
+                  reference year (tsObs.time - mdlFile.re)
+    brk         - Tsbrk object of the break
+    mdlFile     - MdlFile object, for the reference year
 
-        elif param[1] == params.O3_X2:
+    Output(s):
+    BreakBasis of read-only 1D numpy arrays the same length as time:
+    off         - 1 after the break, 0 before
+    dv          - time since the break, 0 before
+    exp1, exp2, exp3 - 1 - exp(-dt/tau) of each exp term
+    log         - log(1 + |dt|/tau) of the log term
+    exp1Tau, exp2Tau, exp3Tau, logTau - partials w.r.t. the time 
+                  constants, per unit magnitude
+    """
 
-            if component == X1:
-            
-                partial = np.array([0.]*time.shape[0])
-       
-            elif component == X2:
+    # get the decimal year for the break and reference it to the model
+    # reference year
+    brkYr = brk.decYear - mdlFile.re
 
-                partial = time**3
+    dt = time - brkYr
 
-            elif component == X3:
+    # create boolean array same length as time with True (1) where
+    # time is greater than the time of the break and False (0) where
+    # time is less than the time of the break
+    timeBool = time > brkYr
 
-                partial = np.array([0.]*time.shape[0]) 
+    off = timeBool.astype(np.float64)
+    dv = dt*timeBool
 
-        elif param[1] == params.O3_X3:
+    terms = []
+    for tau in (brk.exp1[0], brk.exp2[0], brk.exp3[0]):
 
-            if component == X1:
-            
-                partial = np.array([0.]*time.shape[0])
-       
-            elif component == X2:
+        # exp(-dt/tau)
+        e = np.divide(dt, -tau)
+        np.exp(e, out=e)
 
-                partial = np.array([0.]*time.shape[0]) 
+        # d/dtau of 1 - exp(-dt/tau) = -dt*exp(-dt/tau)/tau**2
+        eTau = np.multiply(dv, e)
+        eTau *= -1./tau**2
 
-            elif component == X3:
+        # 1 - exp(-dt/tau)
+        np.subtract(1., e, out=e)
+        e *= timeBool
 
-                partial = time**3
-        
-        elif param[1] == params.O4_X1:
+        terms.append((e, eTau))
 
-            if component == X1:
-            
-                partial = time**4
-       
-            elif component == X2:
+    tau = brk.log[0]
 
-                partial = np.array([0.]*time.shape[0]) 
+    # log(1 + |dt|/tau)
+    lg = np.abs(dt)
+    lg /= tau
+    np.log1p(lg, out=lg)
+    lg *= timeBool
 
-            elif component == X3:
+    # d/dtau of log(1 + dt/tau) = -dt/(tau*(tau + dt))
+    lgTau = dt + tau
+    lgTau *= tau
+    np.divide(dv, lgTau, out=lgTau)
+    lgTau *= -1.
 
-                partial = np.array([0.]*time.shape[0]) 
+    basis = BreakBasis(off, dv, terms[0][0], terms[1][0], terms[2][0], lg,
+                       terms[0][1], terms[1][1], terms[2][1], lgTau)
 
-        elif param[1] == params.O4_X2:
+    # partials are handed out as they are, guard them against changes
+    for partial in basis:
+        partial.flags.writeable = False
 
-            if component == X1:
-            
-                partial = np.array([0.]*time.shape[0]) 
-      
-            elif component == X2:
+    return basis
 
-                partial = time**4
+########################################################################
+def xHatPartial( param, tsObs, component, mdlFile, brkFile, basis=None,
+                 brkBasis=None):
 
-            elif component == X3:
+    """
+    Compute the partial derivative of x-hat w.r.t. the given parameter 
+    (param) at the epoch of interest (time) for the component (x1,x2,x3)
+    of interest.
 
-                partial = np.array([0.]*time.shape[0]) 
+    Input(s):
+    param       - list with 2 integers constructed from the paramMap.
+                  first item in list is the value from the 1st column of 
+                  paramMap for the parameter of interest, the 2nd item is 
+                  the value from the 2nd column of paramMap.
+    tsObs       - TimeSeries object with observation data    
+    component   - use constants X1, X2, or X3 to pass function which 
+                  component the parital is being computed for
+    mdlFile     - MdlFile object containing the current value of the 
+                  non-break parameters being estimated.
+    brkFile     - BrkFile object containing the current values of the
+                  Tsbreak model parameters being estimated.
+    basis       - optional dict from genBasis(tsObs.time - mdlFile.re),
+                  pass it in when computing many partials for the same
+                  tsObs. The partials returned for non-break parameters 
+                  are then arrays from basis.
+    brkBasis    - optional BreakBasis from _breakBasis for the break 
+                  of param, pass it in when computing several partials 
+                  of the same break.
 
-        elif param[1] == params.O4_X3:
+    Output(s):
+    partial     - the partial derivative of x-hat w.r.t. the parameter of
+                  interest evaluated at the time of interest and with 
+                  the current model parameters for the component of 
+                  interest. It may be shared with other calls (basis 
+                  arrays, read-only zeros), do not modify it in place.
+    """
+    
+    # get 1D numpy time array from tsObs and reference to the 
+    # reference epoch in mdlFile object
+    time = tsObs.time - mdlFile.re    
 
-            if component == X1:
-            
-                partial = np.array([0.]*time.shape[0]) 
-      
-            elif component == X2:
+    # parameters from the mdlFile will have a zero-th index of 0. Each
+    # of them only enters one component, where its partial is one of the 
+    # basis functions of time, and is zero for the other components
+    if param[0] == params.NON_BRK:
 
-                partial = np.array([0.]*time.shape[0]) 
+        if basis is None:
+            basis = genBasis(time)
 
-            elif component == X3:
+        name, paramComponent = _NON_BRK_BASIS[param[1]]
 
-                partial = time**4
+        if component == paramComponent:
+            partial = basis[name]
+        else:
+            partial = basis['zeros']
 
     # parameters associated with the brkFile will have param  zero-th index
     # greater than 0. Zero-th index of param will be Tsbreak+1 from
     # brkFile.breaks
     else:
-        
-        # get the decimal year for the break associated with this mdl
-        # parameter and reference it to the model reference year
-        brkYr = brkFile.breaks[param[0]-1].decYear
-        brkYr = brkYr - mdlFile.re
-
-        # create boolean array same length as time with True (1) where
-        # time is greater than the time of the break and False (0) where
-        # time is less than the time of the break
-        timeBool = time > brkYr
-
-        exp1 = brkFile.breaks[param[0]-1].exp1
-        exp2 = brkFile.breaks[param[0]-1].exp2
-        exp3 = brkFile.breaks[param[0]-1].exp3
-        log = brkFile.breaks[param[0]-1].log
-
-        if param[1] == params.OFF_X1:
-
-            if component == X1:
-            
-                partial = 1.*timeBool 
-
-            elif component == X2:
-
-                partial = 0.*timeBool
-
-            elif component == X3:
-
-                partial = 0.*timeBool
-
-        elif param[1] == params.OFF_X2:
-
-            if component == X1:
-            
-                partial = 0.*timeBool
-
-            elif component == X2:
-
-                partial = 1.*timeBool 
-
-            elif component == X3:
-
-                partial = 0.*timeBool
-
-        elif param[1] == params.OFF_X3:
-
-            if component == X1:
-            
-                partial = 0.*timeBool
-
-            elif component == X2:
-
-                partial = 0.*timeBool
-
-            elif component == X3:
-
-                partial = 1.*timeBool 
-            
-        elif param[1] == params.DV_X1:
-
-            if component == X1:
-            
-                partial = (time-brkYr)*timeBool
-
-            elif component == X2:
-
-                partial = 0.*timeBool
-
-            elif component == X3:
-
-                partial = 0.*timeBool
-
-        elif param[1] == params.DV_X2:
-
-            if component == X1:
-            
-                partial = 0.*timeBool
-
-            elif component == X2:
-
-                partial = (time-brkYr)*timeBool
-
-            elif component == X3:
-
-                partial = 0.*timeBool
-
-        elif param[1] == params.DV_X3:
-
-            if component == X1:
-            
-                partial = 0.*timeBool
-
-            elif component == X2:
-
-                partial = 0.*timeBool
-
-            elif component == X3:
-
-                partial = (time-brkYr)*timeBool
-            
-        elif param[1] == params.EXP1_TAU:
-
-            if component == X1:
-
-                partial = -(exp1[1]*(time - brkYr)
-                            *np.exp(-(time-brkYr)/exp1[0])
-                            *(1./exp1[0]**2)
-                            *timeBool)
-                
-            elif component == X2:
-
-                partial = -(exp1[2]*(time - brkYr)
-                            *np.exp(-(time-brkYr)/exp1[0])
-                            *(1./exp1[0]**2)
-                            *timeBool)
-                
-            elif component == X3:
-
-                partial = -(exp1[3]*(time - brkYr)
-                            *np.exp(-(time-brkYr)/exp1[0])
-                            *(1./exp1[0]**2)
-                            *timeBool)
-
-        elif param[1] == params.EXP1_X1:
-                
-            if component == X1:
-
-                partial = (1. - np.exp(-(time - brkYr)/exp1[0]))*timeBool
-                
-            elif component == X2:
-
-                partial = 0.*timeBool
-
-            elif component == X3:
-
-                partial = 0.*timeBool
-
-        elif param[1] == params.EXP1_X2:
-
-            if component == X1:
-
-                partial = 0.*timeBool
-               
-            elif component == X2:
-
-                partial = (1. - np.exp(-(time - brkYr)/exp1[0]))*timeBool
-
-            elif component == X3:
-
-                partial = 0.*timeBool
-
-        elif param[1] == params.EXP1_X3:
-
-            if component == X1:
-
-                partial = 0.*timeBool
-               
-            elif component == X2:
-
-                partial = 0.*timeBool
-
-            elif component == X3:
-
-                partial = (1. - np.exp(-(time - brkYr)/exp1[0]))*timeBool
-            
-        elif param[1] == params.EXP2_TAU:
-
-            if component == X1:
-
-                partial = -(exp2[1]*(time - brkYr)
-                            *np.exp(-(time-brkYr)/exp1[0])
-                            *(1./exp1[0]**2)
-                            *timeBool)
-                
-            elif component == X2:
-
-                partial = -(exp2[2]*(time - brkYr)
-                            *np.exp(-(time-brkYr)/exp1[0])
-                            *(1./exp1[0]**2)
-                            *timeBool)
-                
-            elif component == X3:
-
-                partial = -(exp2[3]*(time - brkYr)
-                            *np.exp(-(time-brkYr)/exp1[0])
-                            *(1./exp1[0]**2)
-                            *timeBool)
-
-        elif param[1] == params.EXP2_X1:
-
-            if component == X1:
-
-                partial = (1. - np.exp(-(time - brkYr)/exp2[0]))*timeBool
-               
-            elif component == X2:
-
-                partial = 0.*timeBool
-
-            elif component == X3:
-
-                partial = 0.*timeBool
-
-        elif param[1] == params.EXP2_X2:
-
-            if component == X1:
-
-                partial = 0.*timeBool
-               
-            elif component == X2:
-
-                partial = (1. - np.exp(-(time - brkYr)/exp2[0]))*timeBool
-
-            elif component == X3:
-
-                partial = 0.*timeBool
-
-        elif param[1] == params.EXP2_X3:
-
-            if component == X1:
-
-                partial = 0.*timeBool
-               
-            elif component == X2:
-
-                partial = 0.*timeBool
-
-            elif component == X3:
-
-                partial = (1. - np.exp(-(time - brkYr)/exp2[0]))*timeBool
-            
-        elif param[1] == params.EXP3_TAU:
-
-            if component == X1:
-
-                partial = -(exp3[1]*(time - brkYr)
-                            *np.exp(-(time-brkYr)/exp1[0])
-                            *(1./exp1[0]**2)
-                            *timeBool)
-                
-            elif component == X2:
-
-                partial = -(exp3[2]*(time - brkYr)
-                            *np.exp(-(time-brkYr)/exp1[0])
-                            *(1./exp1[0]**2)
-                            *timeBool)
-                
-            elif component == X3:
-
-                partial = -(exp3[3]*(time - brkYr)
-                            *np.exp(-(time-brkYr)/exp1[0])
-                            *(1./exp1[0]**2)
-                            *timeBool)
-
-        elif param[1] == params.EXP3_X1:
-
-            if component == X1:
-
-                partial = (1. - np.exp(-(time - brkYr)/exp3[0]))*timeBool
-               
-            elif component == X2:
-
-                partial = 0.*timeBool
-
-            elif component == X3:
-
-                partial = 0.*timeBool
-
-        elif param[1] == params.EXP3_X2:
-
-            if component == X1:
-
-                partial = 0.*timeBool
-              
-            elif component == X2:
-
-                partial = (1. - np.exp(-(time - brkYr)/exp3[0]))*timeBool
-
-            elif component == X3:
-
-                partial = 0.*timeBool
-
-        elif param[1] == params.EXP3_X3:
-
-            if component == X1:
-
-                partial = 0.*timeBool
-              
-            elif component == X2:
-
-                partial = 0.*timeBool
-
-            elif component == X3:
-
-                partial = (1. - np.exp(-(time - brkYr)/exp3[0]))*timeBool
-            
-        elif param[1] == params.LOG_TAU:
-
-            if component == X1:
-
-                partial = (-1.)*timeBool*(log[1]*(time - brkYr)
-                          *(1./(log[0]*(log[0] + time - brkYr))))
-                
-            elif component == X2:
-
-                partial = (-1.)*timeBool*(log[2]*(time - brkYr)
-                          *(1./(log[0]*(log[0] + time - brkYr))))
-                
-            elif component == X3:
-
-                partial = (-1.)*timeBool*(log[3]*(time - brkYr)
-                          *(1./(log[0]*(log[0] + time - brkYr))))
-            
-        elif param[1] == params.LOG_X1:
-
-            if component == X1:
-
-                partial = np.log(1. + np.abs(time-brkYr)/log[0])*timeBool
-               
-            elif component == X2:
-
-                partial = 0.*timeBool
-
-            elif component == X3:
-
-                partial = 0.*timeBool
-
-        elif param[1] == params.LOG_X2:
-
-            if component == X1:
-
-                partial = 0.*timeBool
-               
-            elif component == X2:
 
-                partial = np.log(1. + np.abs(time-brkYr)/log[0])*timeBool
+        brk = brkFile.breaks[param[0]-1]
 
-            elif component == X3:
+        # terms shared by all partials of this break
+        if brkBasis is None:
+            brkBasis = _breakBasis(time, brk, mdlFile)
 
-                partial = 0.*timeBool
+        name, paramComponent = _BRK_PARAMS[param[1]]
 
-        elif param[1] == params.LOG_X3:
+        # time constant of an exp or log term; it enters every component,
+        # scaled by that component's magnitude
+        if paramComponent is None:
 
-            if component == X1:
+            partial = (getattr(brk, name)[component]
+                       *getattr(brkBasis, name + 'Tau'))
 
-                partial = 0.*timeBool
-               
-            elif component == X2:
+        # other break parameters only enter their own component
+        elif component != paramComponent:
 
-                partial = 0.*timeBool
+            partial = _zeros(time.shape[0])
 
-            elif component == X3:
+        else:
 
-                partial = np.log(1. + np.abs(time-brkYr)/log[0])*timeBool
+            partial = getattr(brkBasis, name)
 
     return partial
@@ -17,8 +17,6 @@ of the operations listed above on them.
 """
 
 import numpy as np
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 
 from tstools import inputFileIO as ifio
 from tstools import compPos as cp
@@ -202,54 +200,34 @@ class TimeSeries:
         # set coordinate type: automatically XYZ for .txyz2
         self.coordType = XYZ
         
-        decYear = []
-        x = []
-        y = []
-        z = []
-        sigX = []
-        sigY = []
-        sigZ = []
-        Cxy = []
-        Cyz = []
-        Cxz = []
-
+        # station name is the first field of every data line; take it
+        # from the second line as before
         with open(fileName) as rf:
 
-            for i, line in enumerate(rf):
+            rf.readline()
+            self.name = rf.readline().split()[0]
 
-                splitLine = line.split()
-                
-                if i == 1:
-
-                    self.name = splitLine[0]
-
-                decYear.append(float(splitLine[2]))
-                x.append(float(splitLine[3]))
-                y.append(float(splitLine[4]))
-                z.append(float(splitLine[5]))
-                sigX.append(float(splitLine[6]))
-                sigY.append(float(splitLine[7]))
-                sigZ.append(float(splitLine[8]))
-                Cxy.append(float(splitLine[9]))
-                Cyz.append(float(splitLine[10]))
-                Cxz.append(float(splitLine[11]))
-
-        x = np.asarray(x)
-        y = np.asarray(y)
-        z = np.asarray(z)
-
-        sigX = np.asarray(sigX)
-        sigY = np.asarray(sigY)
-        sigZ = np.asarray(sigZ)
-
-        Cxy = np.asarray(Cxy)
-        Cyz = np.asarray(Cyz)
-        Cxz = np.asarray(Cxz)
-
-        self.time = np.asarray(decYear)
-        self.pos = np.stack([x, y, z])
-        self.sig = np.stack([sigX, sigY, sigZ])
-        self.corr = np.stack([Cxy, Cyz, Cxz])
+        # pandas is only needed here, import it on demand so that 
+        # importing timeSeries does not pay for it
+        import pandas as pd
+
+        # parse all numeric columns with pandas' C tokenizer:
+        # decYear, x, y, z, sigX, sigY, sigZ, Cxy, Cyz, Cxz
+        df = pd.read_csv(fileName, sep=r'\s+', header=None, 
+                         usecols=range(2,12), dtype=np.float64, 
+                         engine='c')
+
+        # keep all columns in one (10,N) C-ordered buffer; time, pos, 
+        # sig and corr are row views into it, so each component is 
+        # contiguous and no per-field arrays are allocated (pandas
+        # already stores a single-dtype frame this way, in which case 
+        # this does not copy)
+        cols = np.ascontiguousarray(df.to_numpy().T)
+
+        self.time = cols[0]
+        self.pos = cols[1:4]
+        self.sig = cols[4:7]
+        self.corr = cols[7:10]
 
         self.refPos = np.asarray(self.refPos)
 
@@ -336,16 +314,12 @@ class TimeSeries:
         
             self.time = np.asarray(decYearList)
 
-        # get model computed positions
-        x1,x2,x3 = cp.compPos(self.time, mdlFile, brkFile)
-
-        # add gaussian noise
-        x1 = x1 + posSdList[0]*np.random.randn(self.time.shape[0],)
-        x2 = x2 + posSdList[1]*np.random.randn(self.time.shape[0],)
-        x3 = x3 + posSdList[2]*np.random.randn(self.time.shape[0],)
+        # get model computed positions as a (3,T) array
+        self.pos = cp.compPos(self.time, mdlFile, brkFile)
 
-        # assign computed positions to self.pos
-        self.pos = np.stack([x1,x2,x3])
+        # add gaussian noise (drawn x1 first, then x2, then x3)
+        self.pos += (np.asarray(posSdList, dtype=float)[:,None]
+                     *np.random.randn(3, self.time.shape[0]))
 
         # compute synthetic uncertainties for time series
         # within uniform distribution provided by uncRangeList
@@ -381,19 +355,12 @@ class TimeSeries:
         try:
             if self.coordType == XYZ:
     
-                # compute average position
-
-                avgX = np.mean(self.pos[0])
-                avgY = np.mean(self.pos[1])
-                avgZ = np.mean(self.pos[2])
+                # compute average position and set reference 
+                # coordinates
+                self.refPos = self.pos.mean(axis=1)
 
-                # reference coodinates to average position
-                self.pos[0] = self.pos[0] - avgX
-                self.pos[1] = self.pos[1] - avgY
-                self.pos[2] = self.pos[2] - avgZ
-
-                # set reference coordinates
-                self.refPos = np.asarray([avgX, avgY, avgZ])
+                # reference coodinates to average position (in place)
+                self.pos -= self.refPos[:, None]
 
                 # set coordinate type to differential coordinates
                 self.coordType = DXDYDZ 
@@ -444,90 +411,56 @@ class TimeSeries:
                 self.refPos = refPosLLH
     
                 ###
-                # convert coordinates to ENU using transform.xyz_to_enu()
+                # convert coordinates to ENU using 
+                # transform.xyz_to_enu_batch()
                 ###
-                inPos = self.pos
-
-                # loop over the columns of inPos
-                for i in range(0, np.shape(inPos)[1]):
-
-                    dX = inPos[0][i]
-                    dY = inPos[1][i]
-                    dZ = inPos[2][i]
-                    
-                    # again transform.xyz_to_enu wants lat first 
-                    # then lon so switch the order of refPos[0]
-                    # and refPos[1]
-                    E, N, U = transform.xyz_to_enu( self.refPos[1],
-                                self.refPos[0], dX, dY, dZ)
 
-                    self.pos[0][i] = E
-                    self.pos[1][i] = N
-                    self.pos[2][i] = U
+                # again transform.xyz_to_enu_batch wants lat first 
+                # then lon so switch the order of refPos[0]
+                # and refPos[1]
+                self.pos[:] = transform.xyz_to_enu_batch(self.refPos[1],
+                                self.refPos[0], self.pos)
 
                 ###
                 # convert var/covar mtx to ENU using 
                 # transform.xyz_to_enu_cov()
                 ###
-                inSig = self.sig
-                inCorr = self.corr
-
-                # loop over the columns of inSig and inCovar 
-                # (should be same size)
-                for i in range(0, np.shape(inSig)[1]):
-
-                    sigX = inSig[0][i]
-                    sigY = inSig[1][i]
-                    sigZ = inSig[2][i]
-
-                    Rxy = inCorr[0][i]
-                    Ryz = inCorr[1][i]
-                    Rxz = inCorr[2][i]
-
-                    varX = sigX*sigX
-                    varY = sigY*sigY
-                    varZ = sigZ*sigZ
-
-                    covarXY = Rxy*varX*varY
-                    covarYZ = Ryz*varY*varZ
-                    covarXZ = Rxz*varX*varZ
-
-                    varCovar1 = np.asarray([varX, covarXY, covarXZ])
-                    varCovar2 = np.asarray([covarXY, varY, covarYZ])
-                    varCovar3 = np.asarray([covarXZ, covarYZ, varZ])
-
-                    varCovarXYZ =  np.stack([varCovar1, varCovar2, varCovar3])
-
-                    # again transform.xyz_to_enu_cov() takes
-                    # lat first then lon so switch order of
-                    # refPos[0] and refPos[1]
-                    varCovarENU = transform.xyz_to_enu_cov(
-                                    self.refPos[1], self.refPos[2], 
-                                    varCovarXYZ)
-
-                    varE = varCovarENU[0][0]
-                    varN = varCovarENU[1][1]
-                    varU = varCovarENU[2][2]
-
-                    covarEN = varCovarENU[0][1]
-                    covarNU = varCovarENU[1][2]
-                    covarEU = varCovarENU[0][2]
-
-                    sigE = np.sqrt(varE)
-                    sigN = np.sqrt(varN)
-                    sigU = np.sqrt(varU)
-
-                    Ren = covarEN/varE/varN
-                    Rnu = covarNU/varN/varU
-                    Reu = covarEU/varE/varU
-
-                    self.sig[0][i] = sigE
-                    self.sig[1][i] = sigN
-                    self.sig[2][i] = sigU
-
-                    self.corr[0][i] = Ren
-                    self.corr[1][i] = Rnu
-                    self.corr[2][i] = Reu
+                varX, varY, varZ = self.sig*self.sig
+                Rxy, Ryz, Rxz = self.corr
+
+                covarXY = Rxy*varX*varY
+                covarYZ = Ryz*varY*varZ
+                covarXZ = Rxz*varX*varZ
+
+                # stack of (N,3,3) var/covar matrices, one per epoch
+                varCovarXYZ = np.stack([
+                                np.stack([varX, covarXY, covarXZ], axis=-1),
+                                np.stack([covarXY, varY, covarYZ], axis=-1),
+                                np.stack([covarXZ, covarYZ, varZ], axis=-1)],
+                                axis=1)
+
+                # again transform.xyz_to_enu_cov_batch() takes
+                # lat first then lon so switch order of
+                # refPos[0] and refPos[1]
+                varCovarENU = transform.xyz_to_enu_cov_batch(
+                                self.refPos[1], self.refPos[2], 
+                                varCovarXYZ)
+
+                varE = varCovarENU[:,0,0]
+                varN = varCovarENU[:,1,1]
+                varU = varCovarENU[:,2,2]
+
+                covarEN = varCovarENU[:,0,1]
+                covarNU = varCovarENU[:,1,2]
+                covarEU = varCovarENU[:,0,2]
+
+                self.sig[0] = np.sqrt(varE)
+                self.sig[1] = np.sqrt(varN)
+                self.sig[2] = np.sqrt(varU)
+
+                self.corr[0] = covarEN/varE/varN
+                self.corr[1] = covarNU/varN/varU
+                self.corr[2] = covarEU/varE/varU
 
             else:
 
@@ -598,106 +531,71 @@ class TimeSeries:
         Create an HTML file with time series plot that may be opened 
         in a web browser.
         """
+
+        # plotly is only needed here, import it on demand so that 
+        # importing timeSeries does not pay for it
+        import plotly.graph_objects as go
+        from plotly.subplots import make_subplots
         
-        # set plotting vars depending on coordType
+        # set plotting vars depending on coordType: trace names, 
+        # y-axis units, scale factor from meters and subplot titles
         if self.coordType == XYZ:
-            trace1 = 'X'
-            trace2 = 'Y'
-            trace3 = 'Z'
-            yaxis1 = 'X (m)'
-            yaxis2 = 'Y (m)'
-            yaxis3 = 'Z (m)'
-            plot1 = self.pos[0]
-            plot2 = self.pos[1]
-            plot3 = self.pos[2]
-            sig1 = self.sig[0]
-            sig2 = self.sig[1]
-            sig3 = self.sig[2]
-            spTitle1 = f'X pos. w.r.t. X: {self.refPos[0]} m'
-            spTitle2 = f'Y pos. w.r.t. Y: {self.refPos[1]} m'
-            spTitle3 = f'Z pos. w.r.t. Z: {self.refPos[2]} m'
+            traces = ['X', 'Y', 'Z']
+            units = 'm'
+            scale = 1.0
+            spTitles = (f'X pos. w.r.t. X: {self.refPos[0]} m',
+                        f'Y pos. w.r.t. Y: {self.refPos[1]} m',
+                        f'Z pos. w.r.t. Z: {self.refPos[2]} m')
         elif self.coordType == DXDYDZ:
-            trace1 = 'dX'
-            trace2 = 'dY'
-            trace3 = 'dZ'
-            yaxis1 = 'dX (cm)'
-            yaxis2 = 'dY (cm)'
-            yaxis3 = 'dZ (cm)'
-            plot1 = self.pos[0]*100
-            plot2 = self.pos[1]*100
-            plot3 = self.pos[2]*100
-            sig1 = self.sig[0]*100
-            sig2 = self.sig[1]*100
-            sig3 = self.sig[2]*100
-            spTitle1 = f'X pos. w.r.t. X: {self.refPos[0]} m'
-            spTitle2 = f'Y pos. w.r.t. Y: {self.refPos[1]} m'
-            spTitle3 = f'Z pos. w.r.t. Z: {self.refPos[2]} m'
+            traces = ['dX', 'dY', 'dZ']
+            units = 'cm'
+            scale = 100.0
+            spTitles = (f'X pos. w.r.t. X: {self.refPos[0]} m',
+                        f'Y pos. w.r.t. Y: {self.refPos[1]} m',
+                        f'Z pos. w.r.t. Z: {self.refPos[2]} m')
         elif self.coordType == ENU:
-            trace1 = 'dE'
-            trace2 = 'dN'
-            trace3 = 'dU'
-            yaxis1 = 'dE (cm)'
-            yaxis2 = 'dN (cm)'
-            yaxis3 = 'dU (cm)'
-            plot1 = self.pos[0]*100
-            plot2 = self.pos[1]*100
-            plot3 = self.pos[2]*100
-            sig1 = self.sig[0]*100
-            sig2 = self.sig[1]*100
-            sig3 = self.sig[2]*100
-            spTitle1 = f'E position w.r.t. Lon: {self.refPos[0]} deg'
-            spTitle2 = f'N position w.r.t. Lat: {self.refPos[1]} deg'
-            spTitle3 = f'U position w.r.t. Ht.: {self.refPos[2]} m'
+            traces = ['dE', 'dN', 'dU']
+            units = 'cm'
+            scale = 100.0
+            spTitles = (f'E position w.r.t. Lon: {self.refPos[0]} deg',
+                        f'N position w.r.t. Lat: {self.refPos[1]} deg',
+                        f'U position w.r.t. Ht.: {self.refPos[2]} m')
+
+        # scale all three components at once; rows are passed to 
+        # plotly as views
+        if scale == 1.0:
+            plot = self.pos
+            sig = self.sig
+        else:
+            plot = self.pos*scale
+            sig = self.sig*scale
 
         # make base figure with three subplots with shared x-axes
         fig = make_subplots(rows=3, cols=1, shared_xaxes=True,
                             vertical_spacing=0.1,
-                            subplot_titles=(spTitle1, spTitle2, spTitle3)
+                            subplot_titles=spTitles
                            )
 
-        # add the traces
-        fig.add_trace(go.Scattergl(x=self.time, y=plot1,
-                                 mode='markers',
-                                 name=trace1,
-                                 marker_color='rgba(15,159,212,.8)',
-                                 error_y=dict(
-                                     type='data',
-                                      array=sig1,
-                                             )
-                                  ),
-                      row=1, col=1
-                      )
-        fig.add_trace(go.Scattergl(x=self.time, y=plot2,
-                                 mode='markers',
-                                 name=trace2,
-                                 marker_color='rgba(15,159,212,.8)',
-                                 error_y=dict(
-                                     type='data',
-                                      array=sig2,
-                                             )
-                                  ),
-                      row=2, col=1
-                      )
-        fig.add_trace(go.Scattergl(x=self.time, y=plot3,
-                                 mode='markers',
-                                 name=trace3,
-                                 marker_color='rgba(15,159,212,.8)',
-                                 error_y=dict(
-                                     type='data',
-                                      array=sig3,
-                                             )
-                                  ),
-                      row=3, col=1
-                      )
-
-        # set axis titles and hover text format
-        fig.update_yaxes(title_text=yaxis1, row=1, col=1)
-        fig.update_yaxes(title_text=yaxis2, row=2, col=1)
-        fig.update_yaxes(title_text=yaxis3, row=3, col=1)
-
-        fig.update_xaxes(hoverformat="4.3f", row=1, col=1)
-        fig.update_xaxes(hoverformat="4.3f", row=2, col=1)
-        fig.update_xaxes(hoverformat="4.3f", row=3, col=1)
+        for i, trace in enumerate(traces):
+
+            row = i + 1
+
+            # add the trace
+            fig.add_trace(go.Scattergl(x=self.time, y=plot[i],
+                                     mode='markers',
+                                     name=trace,
+                                     marker_color='rgba(15,159,212,.8)',
+                                     error_y=dict(
+                                         type='data',
+                                          array=sig[i],
+                                                 )
+                                      ),
+                          row=row, col=1
+                          )
+
+            # set axis titles and hover text format
+            fig.update_yaxes(title_text=f'{trace} ({units})', row=row, col=1)
+            fig.update_xaxes(hoverformat="4.3f", row=row, col=1)
 
         # plot style
         plotTitle = (f'Position Time Series for station {self.name} in'+
@@ -20,14 +20,18 @@ material incorporated and stating that such material is not subject to copyright
 """
 
 from numpy.testing import assert_allclose, assert_equal
+import numpy as np
 
+import functools
 import math
+import os
+import re
 import sys
 
 from tstools.util.nutils import watch, msg_err
 import datetime as dt
 
-__all__ = ["DeltaTime", "PreciseTime", "convtime", "format_time", "last_doy"]
+__all__ = ["DeltaTime", "PreciseTime", "PreciseTimeArray", "convtime", "convtime_batch", "format_time", "format_time_factory", "last_doy"]
 __all__.extend(["mm_to_month", "yy_to_yyyy", "yyyy_to_yy"])
 
 format_list = ["mjd", "mjd2", "mjd3", "jd", "cal", "doy", "gps", "gps2",
@@ -98,41 +102,111 @@ class PreciseTime:
         new_mjd2 = add_mjd2(self.get("mjd2"), other.get("day"))
         return PreciseTime("mjd2", new_mjd2)
         
-    def __lt__(self, other):
-        if self.get("cal", self._prec) < other.get("cal", self._prec):
-            return True
+    def _cmp(self, other):
+        """Return -1, 0 or 1 as self is earlier than, the same as (to 
+        within _prec seconds) or later than other. Works on the stored
+        mjd2 values directly instead of converting both to calendar 
+        lists"""
+        dsec = diff_mjd2(self._val, other._val)*86400
+
+        if abs(dsec) < 0.5*self._prec:
+            return 0
+        elif dsec < 0:
+            return -1
         else:
-            return False
+            return 1
+
+    def __lt__(self, other):
+        return self._cmp(other) < 0
             
     def __le__(self, other):
-        if self.get("cal", self._prec) <= other.get("cal", self._prec):
-            return True
-        else:
-            return False
+        return self._cmp(other) <= 0
             
     def __eq__(self, other):
-        if self.get("cal", self._prec) == other.get("cal", self._prec):
-            return True
-        else:
-            return False
+        return self._cmp(other) == 0
             
     def __ne__(self, other):
-        if self.get("cal", self._prec) != other.get("cal", self._prec):
-            return True
-        else:
-            return False
+        return self._cmp(other) != 0
             
     def __gt__(self, other):
-        if self.get("cal", self._prec) > other.get("cal", self._prec):
-            return True
-        else:
-            return False
+        return self._cmp(other) > 0
             
     def __ge__(self, other):
-        if self.get("cal", self._prec) >= other.get("cal", self._prec):
-            return True
+        return self._cmp(other) >= 0
+
+
+class PreciseTimeArray:
+    def __init__(self, fmt, val):
+        """Create PreciseTimeArray object, an array of epochs
+
+        fmt : format, one of the formats supported by convtime_batch
+        val : array of values, laid out as for convtime_batch
+
+        Epochs are stored as two parallel arrays, integer MJD (_mjd) and
+        fraction of day (_frac), the array counterpart of the mjd2 list
+        held by PreciseTime.
+
+        >>> pa = PreciseTimeArray("mjd", [57022.25, 57023.5])
+        >>> (pa + DeltaTime("day", 1.0)).get("mjd")
+        array([57023.25, 57024.5 ])
+        """
+
+        mjd2 = convtime_batch(fmt, "mjd2", val)
+        self._mjd = mjd2[:,0].astype(np.int64)
+        self._frac = mjd2[:,1]
+
+    @classmethod
+    def from_mjd2(cls, mjd, frac):
+        """Create PreciseTimeArray directly from integer MJD and fraction
+        of day arrays, without copying them"""
+        pa = cls.__new__(cls)
+        pa._mjd = mjd
+        pa._frac = frac
+        return pa
+
+    def get(self, fmt, aprx=99):
+        mjd2 = np.empty(self._mjd.shape + (2,))
+        mjd2[:,0] = self._mjd
+        mjd2[:,1] = self._frac
+        return convtime_batch("mjd2", fmt, mjd2, aprx=aprx)
+
+    def __len__(self):
+        return len(self._mjd)
+
+    def __getitem__(self, i):
+        return PreciseTime("mjd2", [int(self._mjd[i]), float(self._frac[i])])
+
+    def __str__(self):
+        return "PTA:{}".format(self.get("cal"))
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __sub__(self, other):
+        """Element-wise difference, other may be a PreciseTimeArray of 
+        the same length or a single PreciseTime; returns a DeltaTime 
+        holding an array of days (same arithmetic as diff_mjd2)
+        """
+
+        if type(other) is PreciseTime:
+            mjd, frac = other._val
         else:
-            return False
+            assert type(other) is PreciseTimeArray
+            mjd, frac = other._mjd, other._frac
+
+        return DeltaTime("day", (self._mjd - mjd) + (self._frac - frac))
+
+    def __add__(self, other):
+        """Add a DeltaTime (scalar or array of days) to every epoch 
+        (same arithmetic as add_mjd2)
+        """
+
+        assert type(other) is DeltaTime
+
+        frac = self._frac + other.get("day")
+        carry = np.floor(frac)
+        return PreciseTimeArray.from_mjd2(self._mjd + carry.astype(np.int64),
+                                          frac - carry)
 
 
 def test1():
@@ -345,53 +419,43 @@ def diff_mjd2(mjd21, mjd22):
 
 def add_mjd2(mjd2, day):
     """
-    >>> add_mjd2([57022, 0.2], 0.9)
-    [57023, 0.10000000000000009]
-    >>> add_mjd2([57022, 0.2], -0.5)
-    [57021, 0.7]
+    >>> add_mjd2((57022, 0.2), 0.9)
+    (57023, 0.10000000000000009)
+    >>> add_mjd2((57022, 0.2), -0.5)
+    (57021, 0.7)
     """
     
-    new_mjd2 = [mjd2[0], mjd2[1] + day]
-    new_mjd2 = clean_mjd2(new_mjd2)
-    return new_mjd2
+    return clean_mjd2((mjd2[0], mjd2[1] + day))
 
 def clean_mjd2(mjd2):
     """
-    >>> clean_mjd2([57022, 0.2])
-    [57022, 0.2]
-    >>> clean_mjd2([57022, 1.2])
-    [57023, 0.19999999999999996]
-    >>> clean_mjd2([57022, 10.2])
-    [57032, 0.1999999999999993]
-    >>> clean_mjd2([57022, -0.2])
-    [57021, 0.8]
-    >>> clean_mjd2([57022, -1.2])
-    [57020, 0.8]
+    >>> clean_mjd2((57022, 0.2))
+    (57022, 0.2)
+    >>> clean_mjd2((57022, 1.2))
+    (57023, 0.19999999999999996)
+    >>> clean_mjd2((57022, 10.2))
+    (57032, 0.1999999999999993)
+    >>> clean_mjd2((57022, -0.2))
+    (57021, 0.8)
+    >>> clean_mjd2((57022, -1.2))
+    (57020, 0.8)
     """
 
-    if mjd2[1] >= 0:    
-        tmp = int(mjd2[1])
-    else:
-        tmp = int(mjd2[1]) - 1
-        
-    new_mjd2 = [None, None]
-    new_mjd2[0] = mjd2[0] + tmp
-    new_mjd2[1] = mjd2[1] - tmp
+    tmp = math.floor(mjd2[1])
         
-    return new_mjd2
+    return (mjd2[0] + tmp, mjd2[1] - tmp)
     
+_MONTH_NAMES = ("January", "February", "March", "April", "May", "June", 
+                "July", "August", "September", "October", "November", 
+                "December")
+
 def mm_to_month(mm):
     """
     >>> mm_to_month(1)
     'January'
     """
 
-    data = ["January", "February", "March", "April", "May", "June", \
-            "July", "August", "September", "October", "November", "December"]
-
-    ret = data[mm - 1]
-
-    return ret
+    return _MONTH_NAMES[mm - 1]
 
 def test_format_time():
     ret = format_time("[MJD0]", PreciseTime("cal", [2019, 2, 11, 0, 0, 0]))
@@ -420,6 +484,41 @@ def test_format_time():
     assert ret == "2019-043 00:00:00.000000"
 
 
+def test_precise_time_array():
+
+    cals = [[2015, 10, 1, 0, 0, 0], [2017, 1, 1, 23, 59, 59.9], 
+            [2019, 2, 11, 12, 0, 1e-9]]
+    pa = PreciseTimeArray("cal", cals)
+    pes = [PreciseTime("cal", cal) for cal in cals]
+
+    for i, pe in enumerate(pes):
+        assert pa[i] == pe
+        assert pa[i].get("mjd2") == pe.get("mjd2")
+
+    for day in (0.2, -0.2, 1.4):
+        actual = (pa + DeltaTime("day", day)).get("mjd2")
+        expected = [(pe + DeltaTime("day", day)).get("mjd2") for pe in pes]
+        assert_equal(actual, expected)
+
+    actual = (pa - pes[0]).get("sec")
+    expected = [(pe - pes[0]).get("sec") for pe in pes]
+    assert_equal(actual, expected)
+
+def test_convtime_batch():
+
+    fmts = ["mjd", "mjd2", "mjd3", "jd", "cal", "gps"]
+
+    mjd2s = [[57022, 0.0], [44244, 0.5], [-100840, 0.25], [58525, 0.1],
+             [58525, 1 - 1e-13], [60000, 0.999999]]
+
+    for aprx in (99, 1e-6, 1.0):
+        for ifmt in fmts:
+            data = [convtime("mjd2", ifmt, mjd2) for mjd2 in mjd2s]
+            for ofmt in fmts:
+                expected = [convtime(ifmt, ofmt, d, aprx) for d in data]
+                actual = convtime_batch(ifmt, ofmt, data, aprx)
+                assert_equal(actual, np.asarray(expected, dtype=float))
+
 def convtime(ifmt, ofmt, data, aprx=99):
     """Convert time formats
 
@@ -455,96 +554,203 @@ def convtime(ifmt, ofmt, data, aprx=99):
     """
 
     # input processing
-    if ifmt == "mjd":
-        mjd2 = mjd_to_mjd2(data)
+    mjd2 = _IN_CONV[ifmt](data)
 
-    elif ifmt == "mjd2":
-        mjd2 = data
+    # output processing
+    if ofmt in _APRX_FORMATS:
+        ret = _OUT_CONV[ofmt](mjd2, aprx=aprx)
+    else:
+        ret = _OUT_CONV[ofmt](mjd2)
 
-    elif ifmt == "mjd3":
-        mjd2 = mjd3_to_mjd2(data)
+    return ret
 
-    elif ifmt == "jd":
-        mjd2 = jd_to_mjd2(data)
+def convtime_batch(ifmt, ofmt, data, aprx=99):
+    """Convert arrays of epochs between time formats
 
-    elif ifmt == "cal":
-        mjd2 = cal_to_mjd2(data)
+    Vectorized counterpart of convtime for the formats "mjd", "mjd2", 
+    "mjd3", "jd", "cal" and "gps". Epochs are held internally as two 
+    parallel arrays, integer MJD and fraction of day, and every 
+    conversion is done with numpy array operations, so converting N 
+    epochs costs a few array passes rather than N convtime calls. 
+    Results match convtime epoch for epoch.
 
-    elif ifmt == "gps":
-        mjd2 = gps_to_mjd2(data)
+    data : for "mjd" and "jd" an array of shape (N,); for the other
+           formats an array of shape (N, k) with one row per epoch laid
+           out as in convtime, e.g. (N, 6) for "cal"
 
-    elif ifmt == "gps2":
-        mjd2 = gps2_to_mjd2(data)
+    Returned arrays follow the same layout (float64; the integer MJD
+    column of "mjd2"/"mjd3" is int64). Only dates in the Gregorian 
+    calendar (on or after 1582-10-15) are supported.
 
-    elif ifmt == "doy":
-        mjd2 = doy_to_mjd2(data)
+    >>> convtime_batch("cal", "mjd", [[2017, 1, 1, 12, 0, 0], [2017, 1, 2, 0, 0, 0]])
+    array([57754.5, 57755. ])
+    """
 
-    elif ifmt == "datetime":
-        mjd2 = datetime_to_mjd2(data)
+    # input processing
+    if ifmt == "mjd":
+        mjd = np.asarray(data, dtype=float)
+        whole = np.floor(mjd)
+        mjdi = whole.astype(np.int64)
+        fd = mjd - whole
+
+    elif ifmt in ("mjd2", "mjd3", "gps"):
+        data = np.asarray(data, dtype=float)
+        if ifmt == "gps":
+            tmp2 = np.trunc(data[:,1]/86400.)
+            mjdi = (data[:,0]*7 + 44244 + tmp2).astype(np.int64)
+            fd = data[:,1]/86400 - tmp2
+        else:
+            mjdi = data[:,0].astype(np.int64)
+            fd = data[:,1]/86400. if ifmt == "mjd3" else data[:,1]
 
-    elif ifmt == "sec":
-        mjd2 = sec_to_mjd2(data)
-      
-    elif ifmt == "year":
-        mjd2 = year_to_mjd2(data)
+    elif ifmt == "jd":
+        mjd = np.asarray(data, dtype=float) - 2400000.5
+        whole = np.floor(mjd)
+        mjdi = whole.astype(np.int64)
+        fd = mjd - whole
+
+    elif ifmt == "cal":
+        data = np.asarray(data, dtype=float)
+        mjdi = _date_to_mjd_arr(data[:,0].astype(np.int64), 
+                                data[:,1].astype(np.int64), 
+                                data[:,2].astype(np.int64))
+        ss = np.trunc(data[:,5])
+        ms = (data[:,5] - ss)*1e6 # convert to microseconds
+        fd = hmsm_to_days(data[:,3], data[:,4], ss, ms)
+
+    else:
+        raise ValueError(f"convtime_batch: unsupported input format {ifmt}")
+
+    if np.any(mjdi < _MJD_GREGORIAN):
+        raise ValueError("convtime_batch: dates before 1582-10-15 are not supported")
 
     # output processing
     if ofmt == "mjd":
-        ret = mjd2_to_mjd(mjd2)
+        ret = mjdi + fd
 
     elif ofmt == "mjd2":
-        ret = mjd2
+        ret = np.empty(mjdi.shape + (2,))
+        ret[:,0] = mjdi
+        ret[:,1] = fd
 
     elif ofmt == "mjd3":
-        ret = mjd2_to_mjd3(mjd2)
+        ret = np.empty(mjdi.shape + (2,))
+        ret[:,0] = mjdi
+        ret[:,1] = fd*86400.
 
     elif ofmt == "jd":
-        ret = mjd2_to_jd(mjd2)
-
-    elif ofmt == "cal":
-        ret = mjd2_to_cal(mjd2, aprx=aprx)
+        ret = (mjdi + fd) + 2400000.5
+
+    elif ofmt in ("cal", "gps"):
+        hh, MM, ss, mjdi = _days_to_hms_arr(mjdi, fd, 
+                                            aprx if ofmt == "cal" else 99)
+        if ofmt == "cal":
+            yyyy, mm, dd = _mjd_to_date_arr(mjdi)
+            ret = np.stack([yyyy, mm, dd, hh, MM, ss], axis=-1)
+        else:
+            gwkn = np.trunc((mjdi - 44244)/7.).astype(np.int64)
+            gwkd = mjdi - 44244 - 7*gwkn
+            ret = np.stack([gwkn, gwkd*86400 + hh*3600 + MM*60 + ss], 
+                           axis=-1)
 
-    elif ofmt == "gps":
-        ret = mjd2_to_gps(mjd2)
+    else:
+        raise ValueError(f"convtime_batch: unsupported output format {ofmt}")
 
-    elif ofmt == "gps2":
-        ret = mjd2_to_gps2(mjd2, aprx=aprx)
+    return ret
 
-    elif ofmt == "doy":
-        ret = mjd2_to_doy(mjd2, aprx=aprx)
+# integer MJD of 1582-10-15, first day of the Gregorian calendar
+_MJD_GREGORIAN = -100840
+
+def _date_to_mjd_arr(yyyy, mm, dd):
+    """Integer MJD of 0h on Gregorian dates given as integer arrays, 
+    same day count as date_to_jd."""
+    J = (mm <= 2).astype(np.int64)
+    y0 = yyyy + 4800 - J
+    m0 = mm + 12*J - 3
+
+    return (365*y0 + y0//4 - y0//100 + y0//400 + (153*m0 + 2)//5 + dd 
+            - 2432046)
+
+def _mjd_to_date_arr(mjd):
+    """Gregorian year, month, day from integer MJD arrays, same 
+    algorithm as jd_to_date."""
+    N = mjd + 2432045
+    N1 = (4*N + 3)//146097
+    N2 = N - 146097*N1//4
+    N3 = (4*N2 + 3)//1461
+    N4 = N2 - 1461*N3//4
+    M = (5*N4 + 2)//153
+
+    day = N4 - (153*M + 2)//5 + 1
+    month = M + 3 - 12*(M//10)
+    year = 100*N1 + N3 + M//10 - 4800
 
-    elif ofmt == "datetime":
-        ret = mjd2_to_datetime(mjd2)
+    return year, month, day
 
-    elif ofmt == "sec":
-        ret = mjd2_to_sec(mjd2)
+def _days_to_hms_arr(mjd, fd, aprx=99):
+    """Hours, minutes and seconds of day from fraction of day arrays, 
+    with the seconds optionally rounded to aprx and carried into 
+    minutes, hours and the day as in mjd2_to_cal. Returns the (possibly
+    incremented) integer MJD as well."""
+    hours = fd * 24.
+    hh = np.trunc(hours)
+    hours -= hh
+    
+    mins = hours * 60.
+    MM = np.trunc(mins)
+    mins -= MM
+    
+    secs = mins * 60.
+    ss = np.trunc(secs)
+    secs -= ss
 
-    elif ofmt == "year":
-        ret = mjd2_to_year(mjd2)
+    ss = ss + (secs * 1.e6)*1e-6
 
-    return ret
+    if aprx != 99:
+        ss = np.round(ss/aprx)*aprx
+        carry = ss == 60
+        ss[carry] = 0
+        MM[carry] += 1
+        carry &= MM == 60
+        MM[carry] = 0
+        hh[carry] += 1
+        carry &= hh == 24
+        hh[carry] = 0
+        mjd = mjd + carry
+
+    return hh, MM, ss, mjd
+
+# Internally mjd2 values are (int_mjd, frac_of_day) tuples; convtime 
+# boxes them into lists on output.
 
 def mjd_to_mjd2(mjd):
-    mjd2 = [0, 0]
-    mjd2[1], mjd2[0] = math.modf(mjd)
-    return mjd2
+    # floor, not truncate, so the fraction of day is in [0, 1) for
+    # epochs before MJD 0 too
+    i = math.floor(mjd)
+    return (i, float(mjd - i))
 
 def mjd3_to_mjd2(mjd3):
-    mjd2 = [mjd3[0], 0]
-    mjd2[1] = mjd3[1]/86400.
-    return mjd2
+    return (mjd3[0], mjd3[1]/86400.)
+
+@functools.lru_cache(maxsize=4096)
+def _date_to_mjd_int(yyyy, mm, dd):
+    """Integer MJD of 0h on the date yyyy-mm-dd. Cached, since the 
+    same dates are converted over and over (e.g. format_time converts
+    one epoch to cal, doy and gps2, each of which needs it)
+    """
+    return int(jd_to_mjd(date_to_jd(yyyy, mm, dd)))
 
 def cal_to_mjd2(cal):
-    jd = date_to_jd(cal[0], cal[1], cal[2])
-    mjd = jd_to_mjd(jd)
+    mjd = _date_to_mjd_int(cal[0], cal[1], cal[2])
     ss = int(cal[5])
     ms = (cal[5] - ss)*1e6 # convert to microseconds
     fd = hmsm_to_days(cal[3], cal[4], ss, ms)
-    return [int(mjd), fd]
+    return (mjd, fd)
 
 def jd_to_mjd2(jd):
     mjd = jd_to_mjd(jd)
-    return int(mjd), mjd - int(mjd)
+    i = math.floor(mjd)
+    return (i, mjd - i)
 
 def gps_to_mjd2(gps):
     mjd0 = 44244 # 1980/1/6
@@ -552,23 +758,19 @@ def gps_to_mjd2(gps):
     tmp2 = int(gps[1]/86400.)
     mjd = tmp1 + mjd0 + tmp2
     fd = gps[1]/86400 - tmp2
-    return [mjd, fd]
+    return (mjd, fd)
 
 def gps2_to_mjd2(gps2):
-    mjd2 = gps_to_mjd2([gps2[0], 0])
-    mjd2[0] += int(gps2[1])
+    mjd = gps_to_mjd2((gps2[0], 0))[0] + int(gps2[1])
     ss = int(gps2[4])
     ms = (gps2[4] - int(gps2[4]))*1e6
-    mjd2[1] = hmsm_to_days(gps2[2], gps2[3], ss, ms)
-    return mjd2
+    return (mjd, hmsm_to_days(gps2[2], gps2[3], ss, ms))
 
 def doy_to_mjd2(doy):
     yyyy = doy[0]
-    mjd2 = cal_to_mjd2([yyyy, 1, 1, doy[2], doy[3], doy[4]])
-    mjd2[0] += doy[1] - 1
-    mjd2 = clean_mjd2(mjd2)
+    mjd, fd = cal_to_mjd2((yyyy, 1, 1, doy[2], doy[3], doy[4]))
 
-    return mjd2
+    return clean_mjd2((mjd + doy[1] - 1, fd))
 
 def datetime_to_mjd2(datetime):
     yyyy = datetime.year
@@ -583,30 +785,44 @@ def datetime_to_mjd2(datetime):
     return cal_to_mjd2(cal)
 
 def sec_to_mjd2(sec):
-    datetime = dt.datetime.fromtimestamp(sec)
-    return datetime_to_mjd2(datetime)
+    # POSIX epoch (1970-01-01 00:00:00 UTC) is MJD 40587
+    d, r = divmod(sec, 86400.0)
+    return (40587 + int(d), r/86400.0)
+
+def _days_in_year(yyyy):
+    """Return the number of days in year yyyy (Julian calendar before 
+    the 1582 reform, Gregorian after)"""
+
+    y = int(yyyy)
+    if 1582 < y < 102499:
+        # Gregorian leap rule as a multiply-and-mask (Hueffner)
+        leap = ((y*1073750999) & 3221352463) <= 126976
+        return 366 if leap else 365
+    elif y < 1582:
+        return 366 if y % 4 == 0 else 365
+    else:
+        return convtime("cal", "doy", [y, 12, 31, 0, 0, 0])[1]
 
 def year_to_mjd2(year):
     iyear = int(year)
     fyear = year - iyear
 
-    num_days_in_year = convtime("cal", "doy", [iyear, 12, 31, 0, 0, 0])[1]
+    num_days_in_year = _days_in_year(iyear)
     day = num_days_in_year*fyear
 
     iday = int(day)
     fday = day - iday
 
-    mjd2 = convtime("doy", "mjd2", [iyear, iday+1, 0, 0, 0])
-    mjd2[1] = fday
+    mjd = _date_to_mjd_int(iyear, 1, 1) + iday
 
-    return mjd2
+    return (mjd, fday)
 
 def mjd2_to_year(mjd2):
-    doy = mjd2_to_doy(mjd2)
-    iyear = doy[0]
+    mjd = mjd2[0]
+    iyear = jd_to_date(mjd_to_jd(mjd))[0]
 
-    num_days_in_year = convtime("cal", "doy", [iyear, 12, 31, 0, 0, 0])[1]
-    fyear = (doy[1] - 1 + mjd2[1])/num_days_in_year
+    num_days_in_year = _days_in_year(iyear)
+    fyear = (mjd - _date_to_mjd_int(iyear, 1, 1) + mjd2[1])/num_days_in_year
     
     year = iyear + fyear
 
@@ -625,12 +841,13 @@ def mjd2_to_jd(mjd2):
     jd = mjd_to_jd(mjd2[0] + mjd2[1])
     return jd
 
-def mjd2_to_cal(mjd2, aprx=99):
+def _mjd2_to_hms(mjd2, aprx=99):
+    """Split mjd2 into MJD and hours, minutes, seconds of day, with the
+    seconds optionally rounded to aprx and carried into the day"""
     mjd = mjd2[0]
 
     hh, MM, ss, ms = days_to_hmsm(mjd2[1])
     ss = ss + ms*1e-6
-    jd = mjd_to_jd(mjd)
 
     if aprx != 99:
         ss = round(ss/aprx)*aprx
@@ -642,9 +859,14 @@ def mjd2_to_cal(mjd2, aprx=99):
                 hh += 1
                 if hh == 24:
                     hh = 0
-                    jd += 1
+                    mjd += 1
 
-    yyyy, mm, dd = jd_to_date(jd)
+    return mjd, hh, MM, ss
+
+def mjd2_to_cal(mjd2, aprx=99):
+    mjd, hh, MM, ss = _mjd2_to_hms(mjd2, aprx)
+
+    yyyy, mm, dd = jd_to_date(mjd_to_jd(mjd))
 
     return [yyyy, mm, int(dd), hh, MM, ss]
 
@@ -654,20 +876,19 @@ def mjd2_to_gps(mjd2):
     return [gwkn, gsec]
 
 def mjd2_to_gps2(mjd2, aprx=99):
-    yyyy, mm, dd, hh, mn, ss = mjd2_to_cal(mjd2, aprx)
-    mjd2 = cal_to_mjd2([yyyy, mm, dd, 0, 0, 0])
+    mjd, hh, mn, ss = _mjd2_to_hms(mjd2, aprx)
 
+    # GPS week and day of week straight from the MJD, no calendar
+    # round trip needed (weeks truncate toward zero before 1980/1/6)
     mjd0 = 44244 # 1980/1/6
-    tmp1 = int((mjd2[0] - mjd0)/7.)
-    tmp2 = mjd2[0] - mjd0 - 7*tmp1
-    gwkn = tmp1
-    gwkd = tmp2
-    return [int(gwkn), int(gwkd), hh, mn, ss]
+    gwkn = int((mjd - mjd0)/7.)
+    gwkd = mjd - mjd0 - 7*gwkn
+    return [gwkn, int(gwkd), hh, mn, ss]
 
 def mjd2_to_doy(mjd2, aprx=99):
     yyyy, mm, dd, hh, mn, ss = mjd2_to_cal(mjd2, aprx)
-    mjd = cal_to_mjd2([yyyy, mm, dd, 0, 0, 0])[0]
-    mjd0 = cal_to_mjd2([yyyy, 1, 1, 0, 0, 0])[0]
+    mjd = _date_to_mjd_int(yyyy, mm, dd)
+    mjd0 = _date_to_mjd_int(yyyy, 1, 1)
     ddd = mjd - mjd0 + 1
 
     return [yyyy, ddd, hh, mn, ss]
@@ -682,8 +903,39 @@ def mjd2_to_datetime(mjd2):
     return datetime
 
 def mjd2_to_sec(mjd2):
-    datetime = mjd2_to_datetime(mjd2)
-    return datetime.timestamp()
+    return (mjd2[0] - 40587)*86400.0 + mjd2[1]*86400.0
+
+# convtime dispatch tables: format -> converter to/from mjd2
+_IN_CONV = {
+    "mjd": mjd_to_mjd2,
+    "mjd2": lambda mjd2: mjd2,
+    "mjd3": mjd3_to_mjd2,
+    "jd": jd_to_mjd2,
+    "cal": cal_to_mjd2,
+    "gps": gps_to_mjd2,
+    "gps2": gps2_to_mjd2,
+    "doy": doy_to_mjd2,
+    "datetime": datetime_to_mjd2,
+    "sec": sec_to_mjd2,
+    "year": year_to_mjd2,
+}
+
+_OUT_CONV = {
+    "mjd": mjd2_to_mjd,
+    "mjd2": lambda mjd2: list(mjd2),
+    "mjd3": mjd2_to_mjd3,
+    "jd": mjd2_to_jd,
+    "cal": mjd2_to_cal,
+    "gps": mjd2_to_gps,
+    "gps2": mjd2_to_gps2,
+    "doy": mjd2_to_doy,
+    "datetime": mjd2_to_datetime,
+    "sec": mjd2_to_sec,
+    "year": mjd2_to_year,
+}
+
+# output formats that take the aprx (seconds rounding) argument
+_APRX_FORMATS = ("cal", "gps2", "doy")
 
 def mjd_to_jd(mjd):
     """
@@ -751,6 +1003,33 @@ def date_to_jd(year,month,day):
     >>> date_to_jd(1985,2,17.25)
     2446113.75
     
+    """
+    # this checks where we are in relation to October 15, 1582, the beginning
+    # of the Gregorian calendar, with the date packed as YYYYMMDD
+    if year*10000 + month*100 + day < 15821015:
+        # before start of Gregorian calendar, use Duffet-Smith
+        return _julian_date_to_jd(year, month, day)
+
+    # after start of Gregorian calendar: integer day count with the 
+    # year shifted to start in March (Neri & Reinhold, "Euclidean affine
+    # functions and their application to calendar algorithms", 2022)
+    J = month <= 2
+    y0 = year + 4800 - J
+    m0 = month + 12*J - 3
+
+    # days from the shifted epoch to the first of the month, minus the
+    # offset to Julian Day at 0h (1720994.5 is added below, as before)
+    K = (365*y0 + y0//4 - y0//100 + y0//400 + (153*m0 + 2)//5 
+         - 32045 - 1720995)
+
+    jd = K + day + 1720994.5
+    
+    return jd
+
+def _julian_date_to_jd(year, month, day):
+    """
+    Convert a date before October 15, 1582 (Julian calendar) to Julian 
+    Day, see date_to_jd.
     """
     if month == 1 or month == 2:
         yearp = year - 1
@@ -759,17 +1038,7 @@ def date_to_jd(year,month,day):
         yearp = year
         monthp = month
     
-    # this checks where we are in relation to October 15, 1582, the beginning
-    # of the Gregorian calendar.
-    if ((year < 1582) or
-        (year == 1582 and month < 10) or
-        (year == 1582 and month == 10 and day < 15)):
-        # before start of Gregorian calendar
-        B = 0
-    else:
-        # after start of Gregorian calendar
-        A = math.trunc(yearp / 100.)
-        B = 2 - A + math.trunc(A / 4.)
+    B = 0
         
     if yearp < 0:
         C = math.trunc((365.25 * yearp) - 0.75)
@@ -818,13 +1087,32 @@ def jd_to_date(jd):
     
     F, I = math.modf(jd)
     I = int(I)
-    
-    A = math.trunc((I - 1867216.25)/36524.25)
-    
-    if I > 2299160:
-        B = I + 1 + A - math.trunc(A / 4.)
-    else:
-        B = I
+
+    if I <= 2299160:
+        # before start of Gregorian calendar, use Duffet-Smith
+        return _julian_jd_to_date(I, F)
+
+    # Gregorian calendar: integer inverse of the day count used in 
+    # date_to_jd (Neri & Reinhold, 2022), years start in March
+    N = I + 32044
+    N1 = (4*N + 3)//146097
+    N2 = N - 146097*N1//4
+    N3 = (4*N2 + 3)//1461
+    N4 = N2 - 1461*N3//4
+    M = (5*N4 + 2)//153
+
+    day = N4 - (153*M + 2)//5 + 1 + F
+    month = M + 3 - 12*(M//10)
+    year = 100*N1 + N3 + M//10 - 4800
+
+    return year, month, day
+
+def _julian_jd_to_date(I, F):
+    """
+    Convert integer and fractional parts of (Julian Day + 0.5) to a 
+    date in the Julian calendar, see jd_to_date.
+    """
+    B = I
         
     C = B + 1524
     
@@ -920,20 +1208,25 @@ def days_to_hmsm(days):
     (2, 24, 0, 1.2789769243681803e-06)
     
     """
+    # split off the whole part at each step with int(), the remainder
+    # x - int(x) is exact (same values as math.modf, without the tuple)
     hours = days * 24.
-    hours, hour = math.modf(hours)
+    hour = int(hours)
+    hours -= hour
     
     mins = hours * 60.
-    mins, min = math.modf(mins)
+    min = int(mins)
+    mins -= min
     
     secs = mins * 60.
-    secs, sec = math.modf(secs)
+    sec = int(secs)
+    secs -= sec
     
     #micro = round(secs * 1.e6)
     #return int(hour), int(min), int(sec), int(micro)
     
     micro = secs * 1.e6
-    return int(hour), int(min), int(sec), micro
+    return hour, min, sec, micro
     
  
 def datetime_to_jd(date):
@@ -1103,7 +1396,8 @@ class datetime(dt.datetime):
         return jd_to_mjd(self.to_jd())
 
 
-if False:
+# Optional compiled drop-in, opt in with TSTOOLS_USE_C=1
+if os.environ.get("TSTOOLS_USE_C") == "1":
     try:
         import convtimeX as cv
     
@@ -1113,10 +1407,9 @@ if False:
         yyyy_to_yy = cv.yyyy_to_yy
         yy_to_yyyy = cv.yy_to_yyyy
     
-    except:
+    except ImportError:
         pass
 
-
 def last_doy(yyyy):
     """Return day of year of December 31
 
@@ -1124,8 +1417,96 @@ def last_doy(yyyy):
     366
     """
 
-    _, ddd, _, _, _ = convtime("cal", "doy", [yyyy, 12, 31, 0, 0, 0])
-    return ddd
+    return _days_in_year(yyyy)
+
+_TOKEN_RE = re.compile(r"\[(WWWW|D|YYYY|YY|DDD|MM|DD|HH|MN|MJD\d+|SS\d+|DSEC\d+)\]")
+
+# Fixed width tokens: (field, format)
+_TOKEN_FMT = {"WWWW": ("gwkn", "%04d"), "D": ("gwkd", "%d"), 
+              "YYYY": ("yyyy", "%04d"), "YY": ("yy", "%02d"), 
+              "DDD": ("ddd", "%03d"), "MM": ("mm", "%02d"), 
+              "DD": ("dd", "%02d"), "HH": ("hh", "%02d"), 
+              "MN": ("mn", "%02d")}
+
+# Floating point tokens: keyword -> (field, integer length)
+_TOKEN_FLOAT = {"MJD": ("mjd", 5), "SS": ("ss", 2), "DSEC": ("dsec", 5)}
+
+
+@functools.lru_cache(maxsize=128)
+def format_time_factory(istr):
+    """Return a function formatting a PreciseTime with template istr
+
+    The template is parsed once, so the returned function can be applied
+    to many epochs without rescanning it.
+
+    >>> fmt = format_time_factory("[YYYY]-[DDD] [HH]:[MN]:[SS3]")
+    >>> fmt(PreciseTime("cal", [2017, 1, 1, 12, 30, 1.5]))
+    '2017-001 12:30:01.500'
+    """
+
+    parts = _TOKEN_RE.split(istr)
+
+    ### Literal text and (field, format) pairs alternate in parts; the
+    ### seconds precision is picked up in the same pass
+
+    ss_prec = dsec_prec = None
+    for i in range(1, len(parts), 2):
+        tok = parts[i]
+        if tok in _TOKEN_FMT:
+            parts[i] = _TOKEN_FMT[tok]
+        else:
+            key = tok.rstrip("0123456789")
+            field, ulen = _TOKEN_FLOAT[key]
+            prec = int(tok[len(key):])
+            if key == "SS" and ss_prec is None:
+                ss_prec = prec
+            elif key == "DSEC" and dsec_prec is None:
+                dsec_prec = prec
+            if prec == 0:
+                tlen = ulen
+            else:
+                tlen = ulen + 1 + prec
+            parts[i] = (field, "%%0%d.%df"%(tlen, prec))
+
+    # DSEC precision wins over SS when both are present
+    aprx = 99
+    if dsec_prec is not None:
+        aprx = 1/(10)**dsec_prec
+    elif ss_prec is not None:
+        aprx = 1/(10)**ss_prec
+
+    fields = set(f for f, _ in parts[1::2])
+    need_doy = "ddd" in fields
+    need_gps = "gwkn" in fields or "gwkd" in fields
+    need_mjd = "mjd" in fields
+
+    def fmt(pe):
+        mjd2 = pe.get("mjd2")
+
+        yyyy, mm, dd, hh, mn, ss = convtime("mjd2", "cal", mjd2, aprx)
+        vals = {"yyyy": yyyy, "yy": yyyy_to_yy(yyyy), "mm": mm, "dd": dd, 
+                "hh": hh, "mn": mn, "ss": ss, 
+                "dsec": hh*3600 + mn*60 + ss}
+
+        if need_doy:
+            vals["ddd"] = convtime("mjd2", "doy", mjd2, aprx)[1]
+
+        if need_gps:
+            vals["gwkn"], vals["gwkd"] = convtime("mjd2", "gps2", mjd2, 
+                                                  aprx)[:2]
+
+        if need_mjd:
+            vals["mjd"] = convtime("mjd2", "mjd", mjd2)
+
+        out = parts[:]
+        for i in range(1, len(out), 2):
+            field, f = out[i]
+            out[i] = f%(vals[field])
+
+        return "".join(out)
+
+    return fmt
+
 
 def format_time(istr, pe):
     """Return string representation of time
@@ -1139,68 +1520,5 @@ def format_time(istr, pe):
     '2017 001 01 01 00 00 00.000000000001'
     """
 
-    def find_precision(istr, keyword):
-        ind0 = istr.find("[%s"%(keyword))
-        ind1 = ind0 + len(keyword) + 1
-        ind2 = ind1 + istr[ind1:].find("]")
-        prec = int(istr[ind1:ind2])
-
-        return prec
-
-    def format_float(istr, keyword, ulen, val):
-        ind0 = istr.find("[%s"%(keyword))
-        ind1 = ind0 + len(keyword) + 1
-        ind2 = ind1 + istr[ind1:].find("]")
-        prec = int(istr[ind1:ind2])
-        if prec == 0:
-            tlen = ulen
-        else:
-            tlen = ulen + 1 + prec
-        fstr = "%%0%d.%df"%(tlen, prec)
-        istr = istr.replace(istr[ind0:ind2+1], fstr%(val))
-
-        return istr
-
-    if isinstance(pe, PreciseTime):
-        mjd2 = pe.get("mjd2")
-
-    ### Find out sec precision first
-
-    aprx = 99
-    if istr.find("[SS") > -1:
-        prec = find_precision(istr, "SS")
-        aprx = 1/(10)**prec
-
-    if istr.find("[DSEC") > -1:
-        prec = find_precision(istr, "DSEC")
-        aprx = 1/(10)**prec
-
-    yyyy, mm, dd, hh, mn, ss = convtime("mjd2", "cal", mjd2, aprx)
-    yyyy, ddd = convtime("mjd2", "doy", mjd2, aprx)[:2]
-    gwkn, gwkd = convtime("mjd2", "gps2", mjd2, aprx)[:2]
-    mjd = convtime("mjd2", "mjd", mjd2)
-    dsec = hh*3600 + mn*60 + ss
-
-    yy = yyyy_to_yy(yyyy)
-
-    istr = istr.replace("[WWWW]", "%04d"%(gwkn))
-    istr = istr.replace("[D]", "%d"%(gwkd))
-    istr = istr.replace("[YYYY]", "%04d"%(yyyy))
-    istr = istr.replace("[YY]", "%02d"%(yy))
-    istr = istr.replace("[DDD]", "%03d"%(ddd))
-    istr = istr.replace("[MM]", "%02d"%(mm))
-    istr = istr.replace("[DD]", "%02d"%(dd))
-    istr = istr.replace("[HH]", "%02d"%(hh))
-    istr = istr.replace("[MN]", "%02d"%(mn))
-
-    if istr.find("[MJD") > -1:
-        istr = format_float(istr, "MJD", 5, mjd)
-
-    if istr.find("[SS") > -1:
-        istr = format_float(istr, "SS", 2, ss)
-
-    if istr.find("[DSEC") > -1:
-        istr = format_float(istr, "DSEC", 5, dsec)
-
-    return istr
+    return format_time_factory(istr)(pe)
 
@@ -3,20 +3,38 @@
 import os
 import subprocess
 import sys
+import tempfile
 
 #from nutils import get_temporary_file_name
 
 __all__ = ["get_temporary_file_name", "exe_cmd"]
 
 def get_temporary_file_name(dirn="/tmp"):
-    import uuid
-    return dirn + "/" + str(uuid.uuid4())
+    """Create an empty temporary file in dirn and return its name
+
+    The file is created atomically (O_EXCL) by tempfile.mkstemp, so two
+    callers can never be handed the same name.
+    """
+    fd, name = tempfile.mkstemp(dir=dirn)
+    os.close(fd)
+    return name
+
+def _cmd_args(cmd):
+    """Return (args, shell) for subprocess
+
+    A command string always goes through /bin/sh, so anything the shell
+    understands (builtins, VAR= assignments, comments, empty commands,
+    ...) keeps working; an argument list is executed directly.
+    """
+    if isinstance(cmd, str):
+        return cmd, True
+    return list(cmd), False
 
 def exe_cmd(cmd, num_returns=0, echo=False):
     """Execute shell command
 
     Input args:
-        cmd (str): shell command
+        cmd (str or list): shell command, or argument list
         num_returns (int): number of returns (0, 1 or 3)
         echo (bool): whether echo the given command or not
 
@@ -37,14 +55,24 @@ def exe_cmd(cmd, num_returns=0, echo=False):
         1) When the executed command fails, the function fails
            with num_returns=0. With num_returns=1 or 3, the function
            does not fail but simply return non-zero value as status.
+
+        2) A command string is run through /bin/sh. Pass an argument
+           list (e.g. ["gunzip", "-c", fn]) to execute the program 
+           directly without starting a shell.
     """
 
     if echo == True:
         print("Executing shell command:", cmd)
         print()
 
+    args, shell = _cmd_args(cmd)
+
     if num_returns in [0, 1]:
-        sts = subprocess.call(cmd, shell=True)
+        try:
+            sts = subprocess.run(args, shell=shell).returncode
+        except FileNotFoundError as exc:
+            print(exc, file=sys.stderr)
+            sts = 127
 
         if num_returns == 0 and sts != 0:
             sys.exit(sts)
@@ -58,9 +86,15 @@ def exe_cmd(cmd, num_returns=0, echo=False):
         out, err, sts = "", "", 0
 
         try:
-            out = subprocess.check_output(cmd, stderr=subprocess.STDOUT, shell=True).decode("utf-8")
-        except subprocess.CalledProcessError as exc:
-            err = exc.output.decode("utf-8")
+            proc = subprocess.run(args, shell=shell, stdout=subprocess.PIPE,
+                                  stderr=subprocess.STDOUT, encoding="utf-8")
+        except FileNotFoundError as exc:
+            return 1, out, str(exc)
+
+        if proc.returncode == 0:
+            out = proc.stdout
+        else:
+            err = proc.stdout
             sts = 1
 
         return sts, out, err
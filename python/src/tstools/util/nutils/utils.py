@@ -1,7 +1,10 @@
 
 import os
+import subprocess
+import sys
 
 from . import exe_cmd, watch, msg_exc
+from .exe_cmd_p import get_temporary_file_name
 
 __all__ = ["close_Z", "len_iter", "list_map",
            "open_Z", "read_file", "sort_by_list"]
@@ -82,17 +85,18 @@ def len_iter(iiter):
 
 
 def open_Z(fn):
-    from nutils import exe_cmd
-
     tfn = get_temporary_file_name()
-    exe_cmd("gunzip -c %s > %s" % (fn, tfn))
+    with open(tfn, "wb") as f:
+        sts = subprocess.run(["gunzip", "-c", fn], stdout=f).returncode
+
+    if sts != 0:
+        sys.exit(sts)
+
     return tfn
 
 
 def close_Z(tfn):
-    from nutils import exe_cmd
-
-    exe_cmd("rm %s" % (tfn))
+    os.remove(tfn)
     return
 
 
@@ -44,10 +44,71 @@ a2 = a*a                        # semi-major axis squared (m^2)
 f = 1.0/inv_f                   # flattening (unitless)
 e2 = 2.0*f - f*f                # eccentricity squared (unitless)
 b2 = a2 - a2*e2                 # semi-minor axis squared (m^2)
+oneMinusE2 = 1.0 - e2           # 1 - eccentricity squared (unitless)
 
 # Ref: Misra, P. & Enge, P. "Global Positioning System", 2nd ed., p. 98
 #-----------------------------------------------------------------------
 
+_SCALAR = (int, float)          # types routed to the math module
+
+def compute_F_and_Jac(h, phi, x, y, z, a=a, e2=e2, _SCALAR=_SCALAR):
+
+    """Compute F and the four elements of its Jacobian J_F together, 
+    sharing the trig. functions, N and p between them. Works on scalars
+    and on arrays. Returns:
+
+        (f, g, df/dh, df/dphi, dg/dh, dg/dphi)
+
+    see functions: compute_F and compute_Jac_F for definitions
+
+    The ellipsoid constants are bound as default arguments so they are
+    local-variable lookups inside this (hot) function; do not pass them.
+    """
+    # plain Python numbers go through the math module, which is much
+    # cheaper per call than dispatching a numpy ufunc on a scalar
+    if (isinstance(h, _SCALAR) and isinstance(phi, _SCALAR) and 
+        isinstance(x, _SCALAR) and isinstance(y, _SCALAR) and 
+        isinstance(z, _SCALAR)):
+        sin, cos, sqrt, arctan = M.sin, M.cos, M.sqrt, M.atan
+    else:
+        sin, cos, sqrt, arctan = np.sin, np.cos, np.sqrt, np.arctan
+
+    # compute necessary trig. functions w.r.t. phi
+    sinPhi = sin(phi)
+    sinPhi2 = sinPhi*sinPhi
+    cosPhi = cos(phi)
+    cosPhi2 = cosPhi*cosPhi
+    
+    # compute N and p
+    N = a/sqrt(1.0 - e2*sinPhi2)
+    p = sqrt(x*x + y*y)
+    p2 = p*p
+
+    # compute f and g
+    f = p/cosPhi - N - h
+    
+    g_term1 = arctan(z/(p*(1.0 - e2*N/(N + h))))
+    g = g_term1 - phi
+
+    # define a few convenient intermediate terms
+
+    q = p2*(h - e2*N + N)*(h - e2*N + N) + z*z*(h+N)*(h+N)
+    s = N*e2*sinPhi*cosPhi/(1.0 - e2*sinPhi2)
+    
+    # compute the four partials
+
+    dfdh = -1.0
+
+    dfdphi = p*sinPhi/cosPhi2 - s
+
+    dgdh = (-1.0)*e2*N*p*z/q
+
+    dgdphi = (e2*h*p*z*s/q) - 1.0
+
+    return f, g, dfdh, dfdphi, dgdh, dgdphi
+
+#-------------------------------------------------------------------------------
+
 def compute_F(h, phi, x, y, z):
     
     """Compute F the vector valued function that gives 
@@ -70,20 +131,7 @@ def compute_F(h, phi, x, y, z):
     
     Ref: Misra, P. & Enge, P. "Global Positioning System", 2nd ed., p. 134 - 135
     """
-    # compute necessary trig. functions w.r.t. phi
-    sinPhi = np.sin(phi)
-    sinPhi2 = sinPhi*sinPhi
-    cosPhi = np.cos(phi)
-    
-    # compute N and p
-    N = a/np.sqrt(1.0 - e2*sinPhi2)
-    p = np.sqrt(x*x + y*y)
-
-    # compute f and g
-    f = p/cosPhi - N - h
-    
-    g_term1 = np.arctan(z/(p*(1.0 - e2*N/(N + h))))
-    g = g_term1 - phi
+    f, g = compute_F_and_Jac(h, phi, x, y, z)[:2]
 
     F = [f,g]
     
@@ -105,36 +153,30 @@ def compute_Jac_F(h, phi, x, y, z):
     
     see function: compute_F for definitions of f and g
     """ 
-    # compute necessary trig. functions for phi
-    sinPhi = np.sin(phi)
-    sinPhi2 = sinPhi*sinPhi
-    cosPhi = np.cos(phi)
-    cosPhi2 = cosPhi*cosPhi
+    # built J_F for output
+    J_F = list(compute_F_and_Jac(h, phi, x, y, z)[2:])
 
-    # compute N and p
-    N = a/np.sqrt(1.0 - e2*sinPhi2)
-    p = np.sqrt(x*x + y*y)
-    p2 = p*p
+    return J_F
 
-    # define a few convenient intermediate terms
+#----------------------------------------------------------------------------
 
-    q = p2*(h - e2*N + N)*(h - e2*N + N) + z*z*(h+N)*(h+N)
-    s = N*e2*sinPhi*cosPhi/(1.0 - e2*sinPhi2)
-    
-    # compute the four partials
+def _newton_step(h, phi, FJ):
 
-    dfdh = -1.0
+    """Take one Newton step for xyz_to_llh from the guess (h, phi) 
+    given FJ, the output of compute_F_and_Jac at that guess. Works on
+    scalars and on arrays. The 2x2 Jacobian is inverted in closed form:
 
-    dfdphi = p*sinPhi/cosPhi2 - s
+        J_F^-1 = 1/det * |  dg/dphi  -df/dphi |
+                         | -dg/dh     df/dh   |
+    """
+    f, g, dfdh, dfdphi, dgdh, dgdphi = FJ
 
-    dgdh = (-1.0)*e2*N*p*z/q
+    det = dfdh*dgdphi - dfdphi*dgdh
 
-    dgdphi = (e2*h*p*z*s/q) - 1.0
-    
-    # built J_F for output
-    J_F = [dfdh, dfdphi, dgdh, dgdphi]
+    h_new = h - (dgdphi*f - dfdphi*g)/det
+    phi_new = phi - (dfdh*g - dgdh*f)/det
 
-    return J_F
+    return h_new, phi_new
 
 #----------------------------------------------------------------------------
 
@@ -170,32 +212,33 @@ def xyz_to_llh(x, y, z):
         exit("error:  x and y cannot both be exactly zero, point must be at least 1e-11 m from pole")
     
     # compute the longitude
-    preLon = np.arctan2(y,x)    # arctan2 returns angle in rads 
+    preLon = M.atan2(y,x)       # atan2 returns angle in rads 
                                 # between [-pi, pi]
 
-    radLon = preLon%(2*np.pi)   # modulo 2*pi returns value 
+    radLon = preLon%(2*M.pi)    # modulo 2*pi returns value 
                                 # in rads between [0, 2*pi)
 
     # compute the projection in the xy-plane of the line extending 
     # from the z-axis to the point that is  normal to the ellipsoid at
     # the surface
 
-    p = np.sqrt(x*x + y*y)
+    p = M.sqrt(x*x + y*y)
     
     # Newton's method requires initial guess
     # start with guess assuming spherical Earth
     # with radius equal to Earth's semi-major axis
 
     radE0 = a 
-    dist0 = np.sqrt(x*x + y*y + z*z)
+    dist0 = M.sqrt(x*x + y*y + z*z)
     h_prime = dist0 - radE0
-    lat_prime = np.arctan2(z,p)     # p is always positive, so even though arctan2
+    lat_prime = M.atan2(z,p)        # p is always positive, so even though atan2
                                     # returns angle in [-pi,pi] with p positive
                                     # lat will always be in [-pi/2,pi/2]
 
     # compute misfit between actual and initial guess
     
-    f_prime, g_prime = compute_F(h_prime, lat_prime, x, y, z)
+    FJ = compute_F_and_Jac(h_prime, lat_prime, x, y, z)
+    f_prime, g_prime = FJ[:2]
 
     # while the error in h and phi is greater than 1e-9 meters
     # keep iterating toward a better solution (note: latitude error 
@@ -204,50 +247,41 @@ def xyz_to_llh(x, y, z):
     
     # add counter variable
     counter = 0
-    while np.absolute(f_prime) > 1e-9 or np.absolute(g_prime) > 1e-12:
+    while abs(f_prime) > 1e-9 or abs(g_prime) > 1e-12:
         
-        # compute the next guess for h and lat
+        # compute the next guess for h and lat; F and J_F at the 
+        # current guess are already known from the previous pass (or 
+        # from the initial guess above)
 
-        # first get derivatives evaluated at last guess for h and lat
+        h_new, lat_new = _newton_step(h_prime, lat_prime, FJ)
 
-        dfdh, dfdlat, dgdh, dgdlat = compute_Jac_F( h_prime, lat_prime, x, y, z)
+        # stop if the step itself has become negligible; far from the 
+        # ellipsoid rounding in f can keep the misfit above 1e-9 m 
+        # even though the solution no longer changes
+        stalled = (abs(h_new - h_prime) < 1e-9 and 
+                   abs(lat_new - lat_prime) < 1e-12)
 
-        # combine elements of the  Jacobian into numpy array
+        h_prime = h_new
+        lat_prime = lat_new
 
-        jacobian = np.array([[dfdh, dfdlat],[dgdh, dgdlat]])
-        
-        # invert the jacobian
-
-        inv_jac = np.linalg.inv(jacobian)
-
-        # get the values for F from last guess for h and lat
+        # get the values for F and J_F at the new guess for h and lat
         # see compute_F documentation for definition of F
         
-        f_prime, g_prime = compute_F(h_prime, lat_prime, x, y, z)
-
-        # combine elements of F into numpy array
-        
-        F = np.array([f_prime, g_prime])
+        FJ = compute_F_and_Jac(h_prime, lat_prime, x, y, z)
+        f_prime, g_prime = FJ[:2]
 
-        # make vector of h_prime and lat_prime
-
-        v_prime = np.array([h_prime, lat_prime])
-
-        # compute next guess for v using Newton's method
-
-        v_new = v_prime.T - np.matmul(inv_jac,F.T)
-
-        # update values for h_prime and lat_prime
-
-        h_prime = v_new[0]
-        lat_prime = v_new[1]
+        if stalled:
+            break
 
         counter = counter + 1
 
         if counter > 2000:
-            break
             print(f'ERROR: loop hit {counter} iterations before meeting convergence criteria')
-            return -1
+            break
+
+    # take one last step from the first guess within tolerance, this
+    # pushes the solution well below the convergence thresholds
+    h_prime, lat_prime = _newton_step(h_prime, lat_prime, FJ)
     
     # h is last guess h_prime
     # radLat is last guess lat_prime in radians
@@ -261,6 +295,74 @@ def xyz_to_llh(x, y, z):
 
 #-----------------------------------------------------------------------
 
+def xyz_to_llh_batch(x, y, z):
+
+    """Array version of xyz_to_llh. x, y and z may be scalars or 
+    arrays of equal shape (meters); lat, lon and h are returned as 
+    arrays of the same shape, in degrees and meters. 
+
+    Newton's method is iterated over all points at once; points that
+    have already converged are held fixed while the rest keep
+    iterating, so the loop runs as many times as the slowest point
+    needs rather than once per point.
+
+    Example:
+
+    >>> lat, lon, h = xyz_to_llh_batch([100000, 100000], [100000, 1000000], [1000000, 1000000])
+    >>> lat.shape
+    (2,)
+    
+    Ref: Misra, P. & Enge, P. "Global Positioning System", 2nd ed., p. 134-135
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    z = np.asarray(z, dtype=float)
+
+    if np.any((x == 0.0) & (y == 0.0)):
+        raise ValueError("x and y cannot both be exactly zero, point must be at least 1e-11 m from pole")
+
+    # longitude in rads between [0, 2*pi)
+    radLon = np.arctan2(y,x)%(2*np.pi)
+
+    # initial guess assuming spherical Earth (see xyz_to_llh)
+    p = np.sqrt(x*x + y*y)
+    h_prime = np.sqrt(x*x + y*y + z*z) - a
+    lat_prime = np.arctan2(z,p)
+
+    FJ = compute_F_and_Jac(h_prime, lat_prime, x, y, z)
+    active = (np.absolute(FJ[0]) > 1e-9) | (np.absolute(FJ[1]) > 1e-12)
+
+    counter = 0
+    while active.any():
+
+        h_new, lat_new = _newton_step(h_prime, lat_prime, FJ)
+
+        # points whose step has become negligible are done as well,
+        # see xyz_to_llh
+        stalled = ((np.absolute(h_new - h_prime) < 1e-9) & 
+                   (np.absolute(lat_new - lat_prime) < 1e-12))
+
+        # only move points that have not yet converged
+        h_prime = np.where(active, h_new, h_prime)
+        lat_prime = np.where(active, lat_new, lat_prime)
+
+        FJ = compute_F_and_Jac(h_prime, lat_prime, x, y, z)
+        active &= ~stalled
+        active &= (np.absolute(FJ[0]) > 1e-9) | (np.absolute(FJ[1]) > 1e-12)
+
+        counter = counter + 1
+
+        if counter > 2000:
+            print(f'ERROR: loop hit {counter} iterations before meeting convergence criteria')
+            break
+
+    # final step for every point, as in xyz_to_llh
+    h_prime, lat_prime = _newton_step(h_prime, lat_prime, FJ)
+
+    return R2D*lat_prime, R2D*radLon, h_prime
+
+#-----------------------------------------------------------------------
+
 def test_xyz_to_llh():
     
     """unit test for xyz_to_llh
@@ -284,25 +386,23 @@ def test_xyz_to_llh():
     required then the tolerance should be set to 1e-5 for ht and 1e-10
     for latitude and longitude)
     """
-    lonInitArray = np.pi*2*np.random.rand(1, 10000)
-    latInitArray = (np.pi/2)*(np.random.rand(1, 10000) - 0.5)
-    hInitArray = 3000.0*np.random.rand(1, 10000)
+    lon = R2D*np.pi*2*np.random.rand(10000)
+    lat = R2D*(np.pi/2)*(np.random.rand(10000) - 0.5)
+    h = 3000.0*np.random.rand(10000)
     
-    for i, lon in enumerate(lonInitArray[0,:]):
-        
-        lat = latInitArray[0,i]
-        h = hInitArray[0,i]
+    x, y, z = llh_to_xyz(lat, lon, h)
 
-        lon = lon*R2D
-        lat = lat*R2D
-        
-        x, y, z = llh_to_xyz( lat, lon, h)
+    latOut, lonOut, hOut = xyz_to_llh_batch(x, y, z)
+
+    assert latOut == pytest.approx(lat, abs=1e-13) # 2 orders of mag smaller than mm
+    assert lonOut == pytest.approx(lon, abs=1e-13) # 2 orders of mag smaller than mm
+    assert hOut == pytest.approx(h, abs=1e-8) # 5 orders of mag smaller than mm
 
-        latOut, lonOut, hOut =  xyz_to_llh( x, y, z)
+    # scalar routine must agree with the array routine
+    for i in range(0, 10000, 100):
 
-        assert latOut == pytest.approx(lat, abs=1e-13) # 2 orders of mag smaller than mm
-        assert lonOut == pytest.approx(lon, abs=1e-13) # 2 orders of mag smaller than mm
-        assert hOut == pytest.approx(h, abs=1e-8) # 5 orders of mag smaller than mm
+        assert xyz_to_llh(x[i], y[i], z[i]) == pytest.approx(
+                [latOut[i], lonOut[i], hOut[i]], abs=1e-8)
 
 #-----------------------------------------------------------------------
 
@@ -313,7 +413,8 @@ def llh_to_xyz( lat, lon, h):
     returns cartesian coordinates. Latitude must be in degrees between
     -90 and 90, longitude must be in degrees between 0 and 360 and height
     must be in meters. Transformation assumes lat, lon and height are 
-    given with respect to WGS84.
+    given with respect to WGS84. lat, lon and h may be scalars or 
+    arrays of equal shape.
 
     xyz are returned in meters
     
@@ -324,19 +425,19 @@ def llh_to_xyz( lat, lon, h):
     
     sinLon = np.sin(lonRad)
     cosLon = np.cos(lonRad)
-    sinLon2 = sinLon*sinLon
-    cosLon2 = cosLon*cosLon
 
     sinLat = np.sin(latRad)
     cosLat = np.cos(latRad)
     sinLat2 = sinLat*sinLat
-    cosLat2 = cosLat*cosLat
 
     N = a/np.sqrt(1.0 - e2*sinLat2)
 
-    x = (N + h)*cosLat*cosLon
-    y = (N + h)*cosLat*sinLon
-    z = (N*(1.0 - e2) + h)*sinLat
+    # distance from the z-axis, shared by x and y
+    rho = (N + h)*cosLat
+
+    x = rho*cosLon
+    y = rho*sinLon
+    z = (N*oneMinusE2 + h)*sinLat
 
     xyz = [x,y,z]
 
@@ -375,6 +476,34 @@ def xyz_to_enu(lat, lon, x, y, z):
 
     return e, n, u
 
+def xyz_to_neu_batch(lat, lon, xyz):
+    """Convert an array of geocentric x, y, z vectors to local north, 
+    east, up at a single (lat, lon). The rotation matrix is built once
+    and applied to all vectors with one matrix product.
+
+    @param lat
+    @param lon
+    @param xyz  array of shape (3,N)
+
+    @return array of shape (3,N) with rows n, e, u
+    """
+
+    clat= M.cos( lat*DEG_TO_RAD )
+    slat= M.sin( lat*DEG_TO_RAD )
+    clon= M.cos( lon*DEG_TO_RAD )
+    slon= M.sin( lon*DEG_TO_RAD )
+
+    R = np.array([[-slat*clon, -slat*slon, clat],
+                  [-slon, clon, 0],
+                  [clat*clon, clat*slon, slat]])
+
+    return R @ xyz
+
+def xyz_to_enu_batch(lat, lon, xyz):
+    neu = xyz_to_neu_batch(lat, lon, xyz)
+
+    return neu[[1, 0, 2]]
+
 def xyz_to_enu_cov(lat, lon, covmat):
     clat= M.cos( lat*DEG_TO_RAD )
     slat= M.sin( lat*DEG_TO_RAD )
@@ -389,6 +518,29 @@ def xyz_to_enu_cov(lat, lon, covmat):
 
     return new_mat
 
+def xyz_to_enu_cov_batch(lat, lon, covmats):
+    """Rotate a stack of geocentric x, y, z covariance matrices at a 
+    single (lat, lon) to local east, north, up. Same as calling 
+    xyz_to_enu_cov on each matrix, but the rotation matrix is built 
+    once and all matrices are rotated in one einsum call.
+
+    @param lat
+    @param lon
+    @param covmats  array of shape (N,3,3)
+
+    @return array of shape (N,3,3)
+    """
+    clat= M.cos( lat*DEG_TO_RAD )
+    slat= M.sin( lat*DEG_TO_RAD )
+    clon= M.cos( lon*DEG_TO_RAD )
+    slon= M.sin( lon*DEG_TO_RAD )
+
+    R = np.array([[-slon, clon, 0],
+                [-slat*clon, -slat*slon, clat],
+                [clat*clon, clat*slon, slat]])
+
+    return np.einsum('ij,njk,lk->nil', R, covmats, R, optimize=True)
+
 
 def xyz_to_llh_est(x, y, z, a=6378137, e=8.1819190842622e-2):
     """
@@ -4,45 +4,95 @@
 Docstring goes here.
 """
 
-from os import chdir, path # import standard libs first
+# annotations are not evaluated at import time, so type hints may
+# name heavy types without importing them at module level
+from __future__ import annotations
 
-import numpy as np         # then 3rd party libs
+# import standard libs first; only import at the top what is used
+# at module level, imports needed by one function go inside it:
+#
+#   def myFunc():
+#       from os import chdir
 
-import timeSeries as ts    # then local libs
+import sys
+from dataclasses import dataclass
+
+# then 3rd party libs; import heavy ones (numpy, scipy, matplotlib)
+# inside the functions that use them so importing this module stays
+# cheap:
+#
+#   def myFunc():
+#       import numpy as np
+#
+# if a module uses numba, pass cache=True to @njit/@jit so compiled
+# code is reused by later runs, and leave out explicit signatures so 
+# functions compile on first call rather than at import:
+#
+#   from numba import njit
+#
+#   @njit(cache=True)
+#   def hotLoop(a):
+#       ...
+
+# then local libs; these can be slow to import as well, so import
+# them where they are used too:
+#
+#   def myFunc():
+#       from tstools import timeSeries as ts
 
 
 ########################################################################
+# a module should do no work at import beyond defining things; put
+# any set-up in a function that is called when it is needed
+#
 # put a line of # immediately above class and function defs
 # line length should be no more than 72 chars long
-def makeMyClass():
+def makeMyClass() -> None:
 
     """
     Function description goes here
     """
 
-    myClassObj = myClass()
+    myClassObj = MyClass()
     myClassObj.doStuff()
 
 ########################################################################
+# for classes that mainly hold data use a dataclass: slots=True gives
+# instances no __dict__ (less memory, faster attribute access) and 
+# frozen=True makes them immutable and hashable. Drop frozen=True for
+# records that must be modified in place, but keep slots=True
+@dataclass(slots=True, frozen=True)
 class MyClass:
 
     """
     Class description goes here
     """
 
+    x: str = 'python'
+
     ####################################################################
     # leave indent with # line so function below is identified as built
     # in
-    def __init__(self):
-
-        self.x = 'python'
-
-    ####################################################################
-    def doStuff(self):
+    def doStuff(self) -> None:
 
         """
         Description of built-in function
         """
         
+        # copy attributes used repeatedly (e.g. in a loop) to locals 
+        # once; a local lookup is cheaper than self.x every time
         x = self.x
-        print(f'wow, indents matter in {x}!')
+
+        # write to sys.stdout directly rather than with print; inside 
+        # loops bind the method to a local first (write = 
+        # sys.stdout.write) and call write(...) in the loop
+        #
+        # for fixed messages written many times in an inner loop, 
+        # encode once outside the loop and write the bytes straight to
+        # the file descriptor (bypasses sys.stdout's buffer, so do not
+        # mix with sys.stdout.write without flushing):
+        #
+        #   msg = b'done\n'
+        #   for ...:
+        #       os.write(1, msg)
+        sys.stdout.write(f'wow, indents matter in {x}!\n')
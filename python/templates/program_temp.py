@@ -4,31 +4,65 @@
 Docstring goes here
 """
 
-from os import path, chdir      # import stanadard libs first
+# annotations are not evaluated at import time, so type hints may
+# name heavy types without importing them at module level
+from __future__ import annotations
 
-import numpy as np              # then 3rd party libs
+# import standard libs first; only import at the top what is used
+# at module level, imports needed by one function go inside it:
+#
+#   def myFunc():
+#       from os import chdir
 
-import timeSeries as ts         # then local libs
+import sys
+
+# then 3rd party libs; import heavy ones (numpy, scipy, matplotlib)
+# inside the functions that use them so startup stays cheap:
+#
+#   def myFunc():
+#       import numpy as np
+
+# then local libs, imported in main() below so importing
+# this file (e.g. to reuse printName) does not load them
 
 ########################################################################
 # define functions first if necessary, functions here should be small
 # if they are big consider putting them in a separate file and
 # importing
-def printName(name):
+def printName(name: str) -> None:
 
     """
     Put function description here
     """
 
-    print(f"This is a function to print: {name}")
+    sys.stdout.write(f"This is a function to print: {name}\n")
 
 
 ########################################################################
-# put if __name__ == "__main__": at top of main part of program so 
-# python compiler knows everything below is to be executed only if this
-# is the main program
-if __name__ == "__main__":
+# put the main part of the program in a function, main(), rather than
+# at module level: it can then be imported and reused without side 
+# effects, and its code is compiled once and cached in __pycache__
+# it is also the entry point if the program is bundled with zipapp:
+#
+#   python -m zipapp <dir> -m program_temp:main -o program.pyz
+def main() -> int:
+
+    """
+    Main program, returns the exit status
+    """
+
+    from tstools import timeSeries as ts
 
     # main code of this file goes below
     name = "Bobby's Burgers"
     printName(name)
+
+    return 0
+
+
+########################################################################
+# put if __name__ == "__main__": at the bottom so main() only runs 
+# when this file is executed as a program, not when it is imported
+if __name__ == "__main__":
+
+    sys.exit(main())
@@ -20,3 +20,7 @@ def test_readUnrTxyz2():
 
     assert series.corr.size == (7759 * 3)
     assert series.corr.shape == (3, 7759)
+
+    # components are contiguous rows of a single buffer
+    assert series.pos.flags.c_contiguous
+    assert series.pos.base is series.sig.base
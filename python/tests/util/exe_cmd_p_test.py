@@ -0,0 +1,45 @@
+import sys
+
+sys.path.append("./src")
+from tstools.util.nutils.exe_cmd_p import exe_cmd
+
+
+def test_exe_cmd_empty():
+    assert exe_cmd("", 1) == 0
+
+
+def test_exe_cmd_env_assignment():
+    assert exe_cmd("FOO=1 true", 1) == 0
+    assert exe_cmd('FOO=bar; test "$FOO" = bar', 1) == 0
+
+
+def test_exe_cmd_builtin():
+    assert exe_cmd("cd /tmp", 1) == 0
+
+    sts, out, err = exe_cmd("cd /tmp && pwd", 3)
+    assert sts == 0
+    assert out.strip() == "/tmp"
+
+
+def test_exe_cmd_comment():
+    sts, out, err = exe_cmd("echo a # b c", 3)
+    assert sts == 0
+    assert out == "a\n"
+
+
+def test_exe_cmd_arg_list():
+    # an argument list is executed without a shell
+    sts, out, err = exe_cmd(["echo", "$HOME", "#"], 3)
+    assert sts == 0
+    assert out == "$HOME #\n"
+
+    assert exe_cmd(["no-such-command-tstools"], 1) == 127
+
+
+def test_exe_cmd_failure():
+    assert exe_cmd("false", 1) != 0
+
+    sts, out, err = exe_cmd("echo oops; exit 2", 3)
+    assert sts == 1
+    assert out == ""
+    assert err == "oops\n"